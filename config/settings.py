@@ -5,6 +5,8 @@ Django settings for learning_platform project.
 from pathlib import Path
 from datetime import timedelta
 
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,12 +34,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'learning',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Сжимает ответы после всех остальных middleware (кроме частичных, 206)
+    'learning.middleware.GZipMiddleware',
+    # До сессий и аутентификации: их чтения тоже могут идти на реплику
+    'learning.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,13 +78,94 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Постоянные соединения: одно соединение на поток переиспользуется CONN_MAX_AGE секунд,
+# поэтому PRAGMA из SQLITE_PRAGMAS выполняются один раз на соединение
+CONN_MAX_AGE = config('CONN_MAX_AGE', default=60, cast=int)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Профиль SQLite (learning/sqlite.py): WAL позволяет читать во время записи,
+# synchronous=NORMAL в режиме WAL не теряет целостность при сбое процесса
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Отрицательное значение - размер кэша страниц в КиБ
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': 'memory',
+}
+
+# Транзакции записи выстраиваются в очередь внутри процесса и повторяются
+# с экспоненциальной задержкой, если базу заблокировал другой процесс
+SQLITE_SERIALIZE_WRITES = True
+SQLITE_WRITE_RETRIES = 5
+SQLITE_WRITE_RETRY_DELAY = 0.05
+
+# Реплики для чтения: файлы SQLite через запятую, например
+# DATABASE_REPLICAS=db-replica.sqlite3; копии обновляет команда sync_sqlite_replicas
+DATABASE_REPLICAS = []
+for index, name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # В тестах реплика - та же база, что и основная
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['learning.routers.ReplicaRouter']
+
+# Сколько секунд после своей записи пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+# Интервал проверки реплики и время её исключения после ошибки
+REPLICA_HEALTH_INTERVAL = 30
+REPLICA_RETRY_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# По умолчанию кэш в памяти процесса (LocMem). При нескольких процессах
+# задайте общий кэш: REDIS_URL (Redis) или CACHE_DIR (файловый кэш процессов
+# одного сервера). В общем кэше процессы видят отметки изменений пользователей,
+# счётчик отзывов токенов и отметки записи для реплик сразу; без него изменения
+# пользователей и отзывы доходят через базу раз в USER_CHANGES_SYNC_SECONDS
+# и REVOCATION_SYNC_SECONDS
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_DIR = config('CACHE_DIR', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -98,6 +186,19 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Профиль хэширования паролей. PASSWORD_HASHER_PROFILE=fast включает MD5
+# для новых паролей - только для нагрузочных тестов, не для production.
+# Остальные хэшеры остаются в списке, чтобы проверять уже сохранённые пароли.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if config('PASSWORD_HASHER_PROFILE', default='default') == 'fast':
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.MD5PasswordHasher')
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -130,7 +231,7 @@ AUTH_USER_MODEL = 'learning.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'learning.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -148,8 +249,27 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Токены содержат роль пользователя (см. learning/authentication.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'learning.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'learning.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'learning.authentication.ClaimsTokenBlacklistSerializer',
 }
 
+# Как часто процесс проверяет в базе изменения пользователей (User.updated_at)
+# и запас на транзакции, зафиксированные позже своего updated_at (секунды)
+USER_CHANGES_SYNC_SECONDS = config('USER_CHANGES_SYNC_SECONDS', default=2, cast=int)
+USER_CHANGES_SYNC_OVERLAP = 60
+
+# Фильтр Блума отозванных refresh-токенов (см. learning/revocation.py):
+# ожидаемое число отзывов и допустимая доля ложных срабатываний
+REVOCATION_BLOOM_CAPACITY = config('REVOCATION_BLOOM_CAPACITY', default=1_000_000, cast=int)
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+# Фильтр сверяется с базой при изменении общего счётчика отзывов и не реже
+# раза в REVOCATION_SYNC_SECONDS; запас на транзакции, зафиксированные позже
+# строк с большим id (секунды)
+REVOCATION_SYNC_SECONDS = config('REVOCATION_SYNC_SECONDS', default=2, cast=int)
+REVOCATION_SYNC_OVERLAP = 60
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
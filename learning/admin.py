@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Section, Material, Test, Question, Answer, TestResult, UserAnswer
+from .models import (
+    User, Section, Material, CompressionDictionary, Test, Question, Answer,
+    TestResult, UserAnswer, TestStats
+)
+from .search import filter_queryset as search_filter_queryset
 
 
 @admin.register(User)
@@ -28,9 +32,16 @@ class AnswerInline(admin.TabularInline):
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ['text', 'test', 'question_type', 'points', 'order']
     list_filter = ['question_type', 'test']
-    search_fields = ['text', 'test__title']
+    search_fields = ['test__title']
     inlines = [AnswerInline]
     ordering = ['test', 'order']
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Текст вопросов ищется по полнотекстовому индексу, а не через LIKE
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip():
+            results |= search_filter_queryset(queryset, search_term)
+        return results, may_have_duplicates
 
 
 @admin.register(Test)
@@ -66,14 +77,21 @@ class SectionAdmin(admin.ModelAdmin):
 class MaterialAdmin(admin.ModelAdmin):
     list_display = ['title', 'section', 'order', 'is_published', 'created_at']
     list_filter = ['is_published', 'created_at', 'section']
-    search_fields = ['title', 'content', 'section__title']
+    search_fields = ['title', 'section__title']
     readonly_fields = ['created_at', 'updated_at']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(section__owner=request.user)
+        return qs.filter(section_owner=request.user)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Содержимое ищется по полнотекстовому индексу, а не через LIKE по всей таблице
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip():
+            results |= search_filter_queryset(queryset, search_term)
+        return results, may_have_duplicates
 
 
 @admin.register(Answer)
@@ -116,3 +134,27 @@ class UserAnswerAdmin(admin.ModelAdmin):
         return False
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(TestStats)
+class TestStatsAdmin(admin.ModelAdmin):
+    list_display = ['test', 'attempts', 'passed', 'pass_rate', 'mean_score', 'updated_at']
+    readonly_fields = [
+        'test', 'attempts', 'passed', 'score_sum', 'score_histogram',
+        'item_counts', 'item_version', 'updated_at'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CompressionDictionary)
+class CompressionDictionaryAdmin(admin.ModelAdmin):
+    list_display = ['section', 'samples', 'created_at']
+    list_filter = ['created_at']
+    readonly_fields = ['section', 'samples', 'created_at']
+    exclude = ['data']
+    
+    def has_add_permission(self, request):
+        # Словари создаёт команда train_compression_dictionaries
+        return False
@@ -0,0 +1,208 @@
+"""Анализ заданий теста по ответам студентов"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from .cache import get_test_version
+from .grading import get_answer_key, load_answer_key
+from .models import Answer, Test, TestResult, TestStats, UserAnswer
+from .routers import use_primary
+from .sqlite import run_serialized
+
+
+# Доля лучших и худших попыток для индекса дискриминации
+DISCRIMINATION_GROUP = 0.27
+
+
+def item_analysis(test):
+    """
+    Возвращает анализ заданий теста с кэшированием.
+    
+    Ключ кэша включает время последнего прохождения и число попыток,
+    поэтому новая отправка или удаление результата дают новый расчёт.
+    """
+    latest = TestResult.objects.filter(test=test).aggregate(
+        completed_at=Max('completed_at'), total=Count('pk')
+    )
+    completed_at = latest['completed_at'].isoformat() if latest['completed_at'] else ''
+    cache_key = (
+        f'learning:item-analysis:{test.pk}:{get_test_version(test)}:'
+        f'{completed_at}:{latest["total"]}'
+    )
+    result = cache.get(cache_key)
+    if result is None:
+        # Расчёт по основной базе: в кэш под ключом не попадут данные старше ключа
+        with use_primary():
+            result = compute_item_analysis(test)
+        cache.set(cache_key, result)
+    return result
+
+
+def _score_groups(histogram):
+    """
+    Границы нижней и верхней групп попыток по баллу.
+    
+    Считаются по гистограмме баллов (101 значение), поэтому
+    попытки с одинаковым баллом всегда попадают в одну группу.
+    """
+    histogram = {score: n for score, n in enumerate(histogram) if n}
+    attempts = sum(histogram.values())
+    threshold = attempts * DISCRIMINATION_GROUP
+    
+    low_cut, seen = None, 0
+    for score in sorted(histogram):
+        seen += histogram[score]
+        if seen >= threshold:
+            low_cut = score
+            break
+    high_cut, seen = None, 0
+    for score in sorted(histogram, reverse=True):
+        seen += histogram[score]
+        if seen >= threshold:
+            high_cut = score
+            break
+    
+    if low_cut is None or high_cut is None or low_cut >= high_cut:
+        # Все попытки с одинаковым баллом: дискриминацию посчитать нельзя
+        return attempts, None, None, 0, 0
+    lower_size = sum(n for score, n in histogram.items() if score <= low_cut)
+    upper_size = sum(n for score, n in histogram.items() if score >= high_cut)
+    return attempts, low_cut, high_cut, lower_size, upper_size
+
+
+def count_items(test, key):
+    """
+    Считает счётчики заданий (формат TestStats.add_answers) по всем ответам теста.
+    
+    Агрегация выполняется в базе: результат - несколько строк на вопрос и балл,
+    а не строка на каждый выбранный вариант. Используется, только когда
+    счётчики устарели (изменились вопросы или удалены результаты).
+    """
+    through = UserAnswer.selected_answers.through
+    counts = {
+        str(question_id): {'answered': 0, 'correct_by_score': {}, 'selected': {}}
+        for question_id in key
+    }
+    question_of = {
+        answer_id: question_id
+        for question_id, question in key.items()
+        for answer_id in question.answer_ids
+    }
+    # Варианты принадлежат только этому тесту: выборы считаются по индексу answer_id
+    for answer_id, n in through.objects.filter(
+        answer_id__in=question_of
+    ).values_list('answer_id').annotate(n=Count('pk')).order_by():
+        question_id = question_of.get(answer_id)
+        if question_id is not None:
+            counts[str(question_id)]['selected'][str(answer_id)] = n
+    
+    qn = connection.ops.quote_name
+    # Для каждого ответа пользователя: сколько вариантов выбрано и сколько из них верных;
+    # затем сворачиваем по вопросу, этим двум числам и баллу попытки
+    sql = f"""
+        SELECT question_id, selected_total, selected_correct, score, COUNT(*)
+        FROM (
+            SELECT ua.{qn('question_id')} AS question_id,
+                   COUNT(sa.{qn('answer_id')}) AS selected_total,
+                   SUM(CASE WHEN a.{qn('is_correct')} THEN 1 ELSE 0 END) AS selected_correct,
+                   tr.{qn('score')} AS score
+            FROM {qn(UserAnswer._meta.db_table)} ua
+            JOIN {qn(TestResult._meta.db_table)} tr ON tr.{qn('id')} = ua.{qn('test_result_id')}
+            LEFT JOIN {qn(through._meta.db_table)} sa ON sa.{qn('useranswer_id')} = ua.{qn('id')}
+            LEFT JOIN {qn(Answer._meta.db_table)} a ON a.{qn('id')} = sa.{qn('answer_id')}
+            WHERE tr.{qn('test_id')} = %s
+            GROUP BY ua.{qn('id')}, ua.{qn('question_id')}, tr.{qn('score')}
+        ) per_answer
+        GROUP BY question_id, selected_total, selected_correct, score
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [test.pk])
+        for question_id, selected_total, selected_correct, score, n in cursor.fetchall():
+            question = key.get(question_id)
+            if question is None:
+                # Вопрос удалён после прохождения
+                continue
+            item = counts[str(question_id)]
+            item['answered'] += n
+            # Выбранные варианты принадлежат вопросу, поэтому ответ верен,
+            # если выбраны все верные варианты и только они
+            if (
+                selected_correct == len(question.correct_ids)
+                and selected_total == selected_correct
+                and (question.question_type != 'single' or selected_total == 1)
+            ):
+                by_score = item['correct_by_score']
+                by_score[str(score)] = by_score.get(str(score), 0) + n
+    return counts
+
+
+def load_item_stats(test):
+    """
+    Возвращает статистику теста со счётчиками заданий и ключ теста.
+    
+    Обычно счётчики уже обновлены отправками (TestStats.record) и читаются
+    одним запросом. Если они посчитаны для другой версии теста, статистика
+    пересчитывается по результатам в основной базе под блокировкой строки.
+    """
+    stats = TestStats.objects.filter(test=test).first()
+    if stats is not None and stats.item_version == get_test_version(test):
+        return stats, get_answer_key(test)
+    
+    def write():
+        with transaction.atomic():
+            # Транзакция начинается с записи, чтобы SQLite сразу взял блокировку
+            # записи, а не повышал её после чтения (см. sqlite.py)
+            TestStats.objects.bulk_create([TestStats(test_id=test.pk)], ignore_conflicts=True)
+            TestStats.rebuild([test.pk])
+            stats = TestStats.objects.select_for_update().get(test_id=test.pk)
+            current = Test.objects.get(pk=test.pk)
+            key = load_answer_key(current)
+            stats.item_counts = count_items(current, key)
+            stats.item_version = get_test_version(current)
+            stats.save(update_fields=['item_counts', 'item_version'])
+        return stats, key
+    
+    # Реплика может отставать: версия и ответы читаются из основной базы
+    with use_primary():
+        return run_serialized(write)
+
+
+def compute_item_analysis(test):
+    """
+    Считает по каждому вопросу трудность (доля попыток с верным ответом),
+    частоту выбора каждого варианта и индекс дискриминации
+    (разница долей верных ответов в верхних и нижних 27% попыток по баллу).
+    
+    Расчёт идёт по счётчикам TestStats, которые обновляются при каждой
+    отправке, поэтому время зависит от числа вопросов, а не попыток.
+    """
+    stats, key = load_item_stats(test)
+    attempts, low_cut, high_cut, lower_size, upper_size = _score_groups(stats.score_histogram)
+    
+    questions = []
+    for question_id, question in key.items():
+        item = stats.item_counts.get(str(question_id), {})
+        count = item.get('answered', 0)
+        correct_by_score = {int(score): n for score, n in item.get('correct_by_score', {}).items()}
+        selected = item.get('selected', {})
+        discrimination = None
+        if lower_size and upper_size:
+            upper = sum(n for score, n in correct_by_score.items() if score >= high_cut)
+            lower = sum(n for score, n in correct_by_score.items() if score <= low_cut)
+            discrimination = round(upper / upper_size - lower / lower_size, 4)
+        questions.append({
+            'question': question_id,
+            'answered': count,
+            'difficulty': round(sum(correct_by_score.values()) / attempts, 4) if attempts else None,
+            'discrimination': discrimination,
+            'answers': [
+                {
+                    'answer': answer_id,
+                    'selected': selected.get(str(answer_id), 0),
+                    'frequency': round(selected.get(str(answer_id), 0) / count, 4) if count else 0,
+                }
+                for answer_id in sorted(question.answer_ids)
+            ],
+        })
+    
+    return {'test': test.pk, 'attempts': attempts, 'questions': questions}
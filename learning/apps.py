@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class LearningConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'learning'
+    
+    def ready(self):
+        from django.contrib.auth.password_validation import get_default_password_validators
+        
+        from . import signals  # noqa: F401
+        
+        # Валидаторы паролей создаются один раз на процесс (lru_cache в Django);
+        # CommonPasswordValidator при этом читает список из 20000 паролей,
+        # поэтому загружаем его при старте, а не в первой регистрации
+        get_default_password_validators()
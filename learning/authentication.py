@@ -0,0 +1,308 @@
+"""JWT-аутентификация по claims токена без запроса пользователя на каждый вызов"""
+import copy
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer, TokenObtainPairSerializer, TokenRefreshSerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .cache import LRUCache
+from .models import User
+from .revocation import revocation_store
+from .routers import set_request_user, use_primary
+from .sqlite import run_serialized
+
+
+# Сколько секунд строка пользователя живёт в памяти процесса
+USER_CACHE_TTL = 60
+
+# user_id -> (время загрузки, пользователь)
+_users = LRUCache(maxsize=1024, ttl=USER_CACHE_TTL)
+
+
+def _user_changed_key(user_id):
+    return f'learning:user-changed:{user_id}'
+
+
+class UserChangeFeed:
+    """
+    Изменения пользователей по User.updated_at, прочитанные из основной базы.
+    
+    Отметка в общем кэше (mark_user_changed) ставится после коммита и может
+    не дойти до процесса (сбой после коммита, изменение вне сигналов), поэтому
+    процесс не реже раза в interval секунд читает пользователей, изменённых
+    с прошлой проверки. overlap - запас на транзакции, зафиксированные позже
+    своего updated_at. Изменения старше жизни access-токена забываются.
+    """
+    
+    def __init__(self, interval, overlap):
+        self.interval = interval
+        self.overlap = overlap
+        self._changed = {}
+        self._synced_at = None
+        self._checked_at = -interval
+        self._lock = threading.Lock()
+    
+    def changed_at(self, user_id):
+        """Время последнего изменения пользователя (Unix time) или 0"""
+        with self._lock:
+            due = time.monotonic() - self._checked_at >= self.interval
+            if due:
+                self._checked_at = time.monotonic()
+        if due:
+            self.sync()
+        return self._changed.get(user_id, 0)
+    
+    def sync(self):
+        lifetime = api_settings.ACCESS_TOKEN_LIFETIME
+        started = timezone.now()
+        with self._lock:
+            self._checked_at = time.monotonic()
+        if self._synced_at is None:
+            since = started - lifetime
+        else:
+            since = self._synced_at - timedelta(seconds=self.overlap)
+        with use_primary():
+            # Создание пользователя изменением не считается: токенов до него нет
+            rows = list(
+                User.objects.filter(
+                    updated_at__gte=since,
+                    updated_at__gt=F('created_at') + timedelta(seconds=1),
+                ).values_list('pk', 'updated_at')
+            )
+        
+        forget_before = (started - lifetime).timestamp()
+        with self._lock:
+            for user_id, updated_at in rows:
+                self._changed[user_id] = updated_at.timestamp()
+            self._changed = {
+                user_id: changed for user_id, changed in self._changed.items()
+                if changed > forget_before
+            }
+            self._synced_at = started
+
+
+user_changes = UserChangeFeed(
+    settings.USER_CHANGES_SYNC_SECONDS, settings.USER_CHANGES_SYNC_OVERLAP
+)
+
+
+def get_user_changed_at(user_id):
+    """
+    Время последнего изменения пользователя: отметка общего кэша или
+    изменение, найденное в базе. Записи LRU и токены, выпущенные раньше,
+    не используются.
+    """
+    return max(cache.get(_user_changed_key(user_id)) or 0, user_changes.changed_at(user_id))
+
+
+def mark_user_changed(user_id):
+    """
+    Отмечает изменение пользователя (сохранение или удаление).
+    
+    Токены, выпущенные до этого момента, больше не принимаются по claims
+    и проверяются по базе, а строки пользователя, загруженные раньше, не
+    берутся из LRU других процессов; отметка хранится не дольше жизни
+    access-токена.
+    """
+    _users.pop(user_id)
+    
+    def mark():
+        _users.pop(user_id)
+        cache.set(
+            _user_changed_key(user_id),
+            time.time(),
+            timeout=int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        )
+    
+    transaction.on_commit(mark)
+
+
+def get_cached_user(user_id, changed_at=None):
+    """
+    Пользователь из LRU процесса или из основной базы.
+    
+    Запись LRU используется, если она не старше USER_CACHE_TTL и загружена
+    после последнего изменения пользователя (changed_at, если уже известно).
+    """
+    cached = _users.get(user_id)
+    if cached is not None:
+        if changed_at is None:
+            changed_at = get_user_changed_at(user_id)
+        if cached[0] > changed_at:
+            # Копия, чтобы изменения в одном запросе не попали в другие
+            return copy.copy(cached[1])
+    
+    loaded_at = time.time()
+    try:
+        with use_primary():
+            user = User.objects.get(pk=user_id)
+    except User.DoesNotExist:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    _users.set(user_id, (loaded_at, user))
+    return copy.copy(user)
+
+
+class ClaimsUser:
+    """
+    Пользователь, восстановленный из подписанных claims access-токена.
+    
+    id, роль и is_superuser берутся из токена, поэтому проверки ролей и
+    фильтры по user.pk не обращаются к базе. Остальные атрибуты (username,
+    email, ...) загружают модель User при первом обращении.
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+    
+    # Те же свойства ролей, что и у модели
+    is_admin = User.is_admin
+    is_teacher = User.is_teacher
+    is_student = User.is_student
+    
+    def __init__(self, token):
+        self.pk = self.id = token[api_settings.USER_ID_CLAIM]
+        self.role = token['role']
+        self.is_superuser = token['is_superuser']
+        self._user = None
+    
+    def get_user(self):
+        """Полная модель пользователя"""
+        if self._user is None:
+            self._user = get_cached_user(self.pk)
+        return self._user
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+    
+    def __eq__(self, other):
+        if isinstance(other, (ClaimsUser, User)):
+            return self.pk == other.pk
+        return NotImplemented
+    
+    def __hash__(self):
+        return hash(self.pk)
+    
+    def __str__(self):
+        return f'ClaimsUser {self.pk} ({self.role})'
+
+
+def resolve_user(user):
+    """Модель User для пользователя запроса (ClaimsUser загружается из кэша)"""
+    if isinstance(user, ClaimsUser):
+        return user.get_user()
+    return user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh-токен с ролью и is_superuser; access-токены копируют эти claims.
+    
+    Отзыв проверяется через revocation_store (фильтр Блума) вместо запроса
+    к BlacklistedToken при каждом обновлении.
+    """
+    
+    @classmethod
+    def for_user(cls, user):
+        # Родительский for_user записывает OutstandingToken
+        create = super().for_user
+        token = run_serialized(lambda: create(user))
+        token.set_user_claims(user)
+        return token
+    
+    def set_user_claims(self, user):
+        self['role'] = user.role
+        self['is_superuser'] = user.is_superuser
+    
+    def check_blacklist(self):
+        if revocation_store.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+    
+    def blacklist(self):
+        return revocation_store.revoke(
+            self.payload[api_settings.JTI_CLAIM],
+            str(self),
+            datetime_from_epoch(self.payload['exp']),
+            user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+        )
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication без SELECT пользователя на каждый запрос.
+    
+    Если токен содержит claims роли и выпущен после последнего изменения
+    пользователя, возвращается ClaimsUser. Иначе (старые токены или токены,
+    выпущенные до изменения пользователя) пользователь читается через LRU.
+    """
+    
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Чтения после собственной записи пользователя идут в основную базу
+            set_request_user(result[0].pk)
+        return result
+    
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        
+        changed_at = get_user_changed_at(user_id)
+        if 'role' in validated_token and validated_token.get('iat', 0) > changed_at:
+            return ClaimsUser(validated_token)
+        
+        user = get_cached_user(user_id, changed_at)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление токенов с актуальными claims роли (роль могла измениться после входа)"""
+    token_class = ClaimsRefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = get_cached_user(refresh[api_settings.USER_ID_CLAIM])
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        refresh.set_user_claims(user)
+        
+        data = {'access': str(refresh.access_token)}
+        
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            
+            data['refresh'] = str(refresh)
+        
+        return data
+
+
+class ClaimsTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = ClaimsRefreshToken
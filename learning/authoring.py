@@ -0,0 +1,97 @@
+"""Массовое создание и обновление вопросов теста"""
+from django.db import transaction
+
+from .models import Question, Answer
+from .signals import defer_test_touch
+from .sqlite import run_serialized
+
+
+QUESTION_FIELDS = ['text', 'question_type', 'points']
+ANSWER_FIELDS = ['text', 'is_correct']
+BATCH_SIZE = 500
+
+
+def _by_order(objects):
+    """Раскладывает объекты по order; повторы order возвращаются отдельным списком"""
+    first = {}
+    duplicates = []
+    for obj in objects:
+        if obj.order in first:
+            duplicates.append(obj.pk)
+        else:
+            first[obj.order] = obj
+    return first, duplicates
+
+
+def save_questions(test, questions_data, replace=False):
+    """
+    Сохраняет вопросы теста с вложенными ответами одной транзакцией.
+    
+    Вопросы сопоставляются с существующими по order: совпавшие обновляются,
+    остальные создаются. Ответы вопроса из запроса заменяются целиком
+    (тоже по order, чтобы сохранить id выбранных ранее вариантов).
+    При replace=True вопросы, которых нет в запросе, удаляются.
+    
+    Число запросов не зависит от числа вопросов и ответов.
+    """
+    def write():
+        with transaction.atomic(), defer_test_touch(test.pk):
+            existing, duplicate_questions = _by_order(
+                Question.objects.filter(test=test).order_by('order', 'id')
+            )
+            existing_answers = {}
+            for answer in Answer.objects.filter(question__test=test).order_by('order', 'id'):
+                existing_answers.setdefault(answer.question_id, []).append(answer)
+            
+            questions_update = []
+            questions_create = []
+            pairs = []
+            for question_data in questions_data:
+                question = existing.pop(question_data['order'], None)
+                if question is None:
+                    question = Question(test=test, order=question_data['order'])
+                    questions_create.append(question)
+                else:
+                    questions_update.append(question)
+                for field in QUESTION_FIELDS:
+                    setattr(question, field, question_data[field])
+                pairs.append((question, question_data['answers']))
+            
+            Question.objects.bulk_update(questions_update, QUESTION_FIELDS, batch_size=BATCH_SIZE)
+            Question.objects.bulk_create(questions_create, batch_size=BATCH_SIZE)
+            
+            answers_update = []
+            answers_create = []
+            answers_delete = []
+            for question, answers_data in pairs:
+                current, duplicates = _by_order(existing_answers.get(question.pk, []))
+                answers_delete.extend(duplicates)
+                for answer_data in answers_data:
+                    answer = current.pop(answer_data['order'], None)
+                    if answer is None:
+                        answer = Answer(question=question, order=answer_data['order'])
+                        answers_create.append(answer)
+                    else:
+                        answers_update.append(answer)
+                    for field in ANSWER_FIELDS:
+                        setattr(answer, field, answer_data[field])
+                answers_delete.extend(answer.pk for answer in current.values())
+            
+            if answers_delete:
+                Answer.objects.filter(pk__in=answers_delete).delete()
+            Answer.objects.bulk_update(answers_update, ANSWER_FIELDS, batch_size=BATCH_SIZE)
+            Answer.objects.bulk_create(answers_create, batch_size=BATCH_SIZE)
+            
+            questions_delete = []
+            if replace:
+                questions_delete = duplicate_questions + [question.pk for question in existing.values()]
+                if questions_delete:
+                    Question.objects.filter(pk__in=questions_delete).delete()
+        
+        return {
+            'created': len(questions_create),
+            'updated': len(questions_update),
+            'deleted': len(questions_delete),
+        }
+    
+    return run_serialized(write)
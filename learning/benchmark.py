@@ -0,0 +1,413 @@
+"""Синтетические данные и замеры SQL-запросов, задержки и памяти для эндпоинтов API"""
+import contextlib
+import itertools
+import queue
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .authentication import ClaimsRefreshToken, user_changes
+from .cache import get_test_version
+from .models import (
+    User, Section, Material, Test, Question, Answer,
+    TestResult, UserAnswer, TestStats, content_metadata
+)
+from .search import get_backend as get_search_backend
+
+
+# Допустимое число запросов на один вызов эндпоинта
+QUERY_CEILINGS = {
+    'users-list': 3,
+    'users-detail': 2,
+    'users-me': 1,
+    'users-register': 3,
+    'users-import': 4,
+    'sections-list': 3,
+    'sections-detail': 3,
+    'sections-search': 2,
+    'materials-list': 3,
+    'materials-detail': 3,
+    'materials-search': 2,
+    'materials-content': 2,
+    'tests-list': 3,
+    'tests-detail': 4,
+    'tests-submit': 14,
+    'tests-stats': 2,
+    'tests-item-analysis': 3,
+    'tests-questions': 18,
+    'test-results-list': 5,
+    'test-results-detail': 5,
+    'test-results-export': 1,
+}
+
+
+def seed_dataset(sections=5, materials=4, questions=20, students=20, answers=4):
+    """
+    Создаёт sections × materials опубликованных материалов с тестом из questions вопросов,
+    преподавателя, администратора и студентов с результатами по всем тестам.
+    
+    Все строки создаются через bulk_create, пароль хэшируется один раз;
+    денормализованные колонки владельца, сведения о содержании и статистика
+    тестов заполняются явно, так как save() и submit не вызываются, а поисковый
+    индекс перестраивается в конце.
+    """
+    password = make_password('benchmark')
+    teacher = User.objects.create(username='bench-teacher', role='teacher', password=password)
+    admin = User.objects.create(username='bench-admin', role='admin', password=password)
+    
+    section_objs = Section.objects.bulk_create([
+        Section(title=f'Раздел {i}', owner=teacher, is_published=True)
+        for i in range(sections)
+    ])
+    content = 'Содержание материала. ' * 50
+    content_length, content_hash, excerpt = content_metadata(content)
+    material_objs = Material.objects.bulk_create([
+        Material(
+            section=section, section_owner=teacher, title=f'Материал {j}',
+            content=content, content_length=content_length, content_hash=content_hash,
+            excerpt=excerpt, order=j, is_published=True
+        )
+        for section in section_objs
+        for j in range(materials)
+    ])
+    test_objs = Test.objects.bulk_create([
+        Test(
+            material=material, title=f'Тест {material.title}',
+            section_owner=teacher, effective_published=True
+        )
+        for material in material_objs
+    ])
+    question_objs = Question.objects.bulk_create([
+        Question(test=test, text=f'Вопрос {i}', order=i)
+        for test in test_objs
+        for i in range(questions)
+    ])
+    answer_objs = Answer.objects.bulk_create([
+        Answer(question=question, text=f'Ответ {j}', is_correct=j == 0, order=j)
+        for question in question_objs
+        for j in range(answers)
+    ])
+    correct = {answer.question_id: answer.pk for answer in answer_objs if answer.is_correct}
+    
+    questions_by_test = {}
+    for question in question_objs:
+        questions_by_test.setdefault(question.test_id, []).append(question)
+    
+    student_objs = User.objects.bulk_create([
+        User(username=f'bench-student-{i}', role='student', password=password)
+        for i in range(students)
+    ])
+    result_objs = TestResult.objects.bulk_create([
+        TestResult(test=test, user=student, owner=teacher, score=100, is_passed=True)
+        for test in test_objs
+        for student in student_objs
+    ])
+    user_answers = UserAnswer.objects.bulk_create([
+        UserAnswer(test_result=result, question=question)
+        for result in result_objs
+        for question in questions_by_test[result.test_id]
+    ])
+    through = UserAnswer.selected_answers.through
+    through.objects.bulk_create([
+        through(useranswer_id=user_answer.pk, answer_id=correct[user_answer.question_id])
+        for user_answer in user_answers
+    ], batch_size=5000)
+    
+    # Статистика и счётчики заданий - такие же, как после отправок через submit
+    stats_objs = []
+    for test in test_objs:
+        stats = TestStats(test=test, item_version=get_test_version(test))
+        stats.attempts = stats.passed = students
+        stats.score_sum = 100 * students
+        stats.score_histogram[100] = students
+        answers = [
+            (question.pk, [correct[question.pk]], True)
+            for question in questions_by_test[test.pk]
+        ]
+        for _ in range(students):
+            stats.add_answers(100, answers)
+        stats_objs.append(stats)
+    TestStats.objects.bulk_create(stats_objs)
+    get_search_backend().rebuild()
+    
+    return {
+        'teacher': teacher,
+        'admin': admin,
+        'students': student_objs,
+        'sections': section_objs,
+        'materials': material_objs,
+        'tests': test_objs,
+        'results': result_objs,
+        'questions': questions,
+        'password': password,
+        'submission': {
+            'answers': [
+                {'question_id': question.pk, 'answer_ids': [correct[question.pk]]}
+                for question in questions_by_test[test_objs[0].pk]
+            ]
+        },
+    }
+
+
+def build_endpoints(data):
+    """
+    Описывает вызовы всех маршрутов learning/urls.py.
+    
+    Каждый элемент: (имя, метод, функция, возвращающая (пользователь, путь, тело)).
+    Для submit, register и import каждый вызов получает новых пользователей;
+    массовое сохранение вопросов меняет последний тест, чтобы не сбрасывать
+    кэш теста, который читают остальные эндпоинты.
+    """
+    student = data['students'][0]
+    teacher = data['teacher']
+    section = data['sections'][0]
+    material = data['materials'][0]
+    test = data['tests'][0]
+    authored_test = data['tests'][-1]
+    result = data['results'][0]
+    counter = itertools.count()
+    
+    def fresh_student():
+        return User.objects.create(
+            username=f'bench-submit-{next(counter)}', role='student', password=data['password']
+        )
+    
+    def registration():
+        username = f'bench-register-{next(counter)}'
+        return {
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': 'Bench-Passw0rd!',
+            'password2': 'Bench-Passw0rd!',
+            'role': 'student',
+        }
+    
+    def user_import():
+        return {'users': [
+            {
+                'username': f'bench-import-{index}',
+                'email': f'bench-import-{index}@example.com',
+                'password': 'Bench-Passw0rd!',
+                'role': 'student',
+            }
+            for index in (next(counter), next(counter))
+        ]}
+    
+    questions = {
+        'mode': 'upsert',
+        'questions': [
+            {
+                'text': f'Вопрос {i}',
+                'question_type': 'single',
+                'points': 1,
+                'order': i,
+                'answers': [
+                    {'text': f'Ответ {j}', 'is_correct': j == 0, 'order': j}
+                    for j in range(4)
+                ],
+            }
+            for i in range(data['questions'])
+        ],
+    }
+    
+    return [
+        ('users-list', 'get', lambda: (data['admin'], '/api/users/', None)),
+        ('users-detail', 'get', lambda: (data['admin'], f'/api/users/{student.pk}/', None)),
+        ('users-me', 'get', lambda: (student, '/api/users/me/', None)),
+        ('users-register', 'post', lambda: (None, '/api/users/register/', registration())),
+        ('users-import', 'post', lambda: (data['admin'], '/api/users/import/', user_import())),
+        ('sections-list', 'get', lambda: (student, '/api/sections/', None)),
+        ('sections-detail', 'get', lambda: (student, f'/api/sections/{section.pk}/', None)),
+        ('sections-search', 'get', lambda: (student, '/api/sections/search/?q=раздел', None)),
+        ('materials-list', 'get', lambda: (student, '/api/materials/', None)),
+        ('materials-detail', 'get', lambda: (student, f'/api/materials/{material.pk}/', None)),
+        ('materials-search', 'get', lambda: (student, '/api/materials/search/?q=содержание', None)),
+        ('materials-content', 'get', lambda: (student, f'/api/materials/{material.pk}/content/', None)),
+        ('tests-list', 'get', lambda: (student, '/api/tests/', None)),
+        ('tests-detail', 'get', lambda: (student, f'/api/tests/{test.pk}/', None)),
+        ('tests-submit', 'post', lambda: (
+            fresh_student(), f'/api/tests/{test.pk}/submit/', data['submission']
+        )),
+        ('tests-stats', 'get', lambda: (teacher, f'/api/tests/{test.pk}/stats/', None)),
+        ('tests-item-analysis', 'get', lambda: (teacher, f'/api/tests/{test.pk}/item-analysis/', None)),
+        ('tests-questions', 'post', lambda: (
+            teacher, f'/api/tests/{authored_test.pk}/questions/', questions
+        )),
+        ('test-results-list', 'get', lambda: (teacher, '/api/test-results/', None)),
+        ('test-results-detail', 'get', lambda: (teacher, f'/api/test-results/{result.pk}/', None)),
+        ('test-results-export', 'get', lambda: (
+            teacher, f'/api/test-results/export/?output=csv&test={test.pk}', None
+        )),
+    ]
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_endpoint(method, prepare, repeat=20):
+    """
+    Вызывает эндпоинт repeat раз и возвращает метрики.
+    
+    Число запросов берётся из первого вызова, задержка - по всем вызовам.
+    Пиковая память замеряется tracemalloc в отдельном вызове, чтобы
+    трассировка не искажала задержку.
+    """
+    client = APIClient()
+    
+    def call(capture):
+        # Запрос аутентифицируется настоящим access-токеном, как клиент API;
+        # выпуск токена не входит в замер
+        user, path, body = prepare()
+        if user is None:
+            client.credentials()
+        else:
+            token = ClaimsRefreshToken.for_user(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        # Изменения пользователей проверяются раз в USER_CHANGES_SYNC_SECONDS,
+        # эта периодическая проверка в замер не входит
+        user_changes.sync()
+        with capture:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, body, format='json')
+            if response.streaming:
+                # Запросы потоковой выгрузки выполняются при чтении тела
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return response, elapsed
+    
+    latencies = []
+    queries = None
+    status_code = None
+    for _ in range(repeat):
+        capture = CaptureQueriesContext(connection)
+        response, elapsed = call(capture)
+        latencies.append(elapsed)
+        if queries is None:
+            queries = len(capture.captured_queries)
+            status_code = response.status_code
+    
+    tracemalloc.start()
+    try:
+        call(contextlib.nullcontext())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'status': status_code,
+        'queries': queries,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'repeat': repeat,
+    }
+
+
+def compare_reports(previous, current, tolerance=0.2):
+    """
+    Сравнивает два отчёта и возвращает список найденных регрессий.
+    
+    Регрессия - рост числа запросов или рост p95 больше чем на tolerance.
+    """
+    regressions = []
+    for name, metrics in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        if metrics['queries'] > before['queries']:
+            regressions.append(f"{name}: запросов {before['queries']} -> {metrics['queries']}")
+        if metrics['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {metrics['p95_ms']} мс")
+    return regressions
+
+
+def measure_concurrent_submits(data, threads=8, submits=200, readers=2):
+    """
+    Отправляет submits прохождений первого теста из threads потоков одновременно
+    с readers потоками, читающими тест, и возвращает пропускную способность.
+    
+    Каждый поток работает со своим соединением; до и после запроса вызывается
+    close_old_connections, как в обработчике WSGI, поэтому CONN_MAX_AGE влияет
+    на переподключения так же, как на сервере. Токены выпускаются заранее.
+    """
+    test = data['tests'][0]
+    path = f'/api/tests/{test.pk}/submit/'
+    students = User.objects.bulk_create([
+        User(username=f'bench-concurrent-{i}', role='student', password=data['password'])
+        for i in range(submits)
+    ])
+    jobs = queue.Queue()
+    for student in students:
+        jobs.put(str(ClaimsRefreshToken.for_user(student).access_token))
+    reader_token = str(ClaimsRefreshToken.for_user(data['students'][0]).access_token)
+    
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+    reads = [0]
+    done = threading.Event()
+    
+    def request(client, method, *args, **kwargs):
+        close_old_connections()
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        finally:
+            close_old_connections()
+    
+    def writer():
+        client = APIClient(raise_request_exception=False)
+        while True:
+            try:
+                token = jobs.get_nowait()
+            except queue.Empty:
+                break
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            started = time.perf_counter()
+            response = request(client, 'post', path, data['submission'], format='json')
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        connection.close()
+    
+    def reader():
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {reader_token}')
+        while not done.is_set():
+            request(client, 'get', f'/api/tests/{test.pk}/')
+            with lock:
+                reads[0] += 1
+        connection.close()
+    
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    
+    succeeded = statuses.get(201, 0)
+    return {
+        'submits': submits,
+        'succeeded': succeeded,
+        'statuses': statuses,
+        'submits_per_second': round(succeeded / elapsed, 1),
+        'reads_per_second': round(reads[0] / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'seconds': round(elapsed, 3),
+    }
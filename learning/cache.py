@@ -0,0 +1,104 @@
+"""Кэширование производных данных тестов"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .middleware import GZIP_MIN_LENGTH, gzip_content
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш в памяти процесса.
+    
+    ttl - необязательное время жизни записи в секундах.
+    """
+    
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def get_test_version(test):
+    """
+    Возвращает версию содержимого теста (вопросов и ответов).
+    
+    Версия - Test.updated_at: его обновляют сохранение теста и сигналы
+    Question/Answer в той же транзакции, что и изменение, поэтому версия
+    общая для всех процессов и не теряется при вытеснении из кэша.
+    """
+    return test.updated_at.isoformat()
+
+
+def _test_payload_key(test, variant):
+    return f'learning:test-payload:{test.pk}:{variant}:{get_test_version(test)}'
+
+
+def get_test_payload(test, variant):
+    """
+    Возвращает готовый JSON теста для варианта 'student' или 'owner'.
+    
+    Результат - словарь с ключами content (bytes), gzip (сжатый content или None),
+    etag и last_modified (unix-время рендеринга) или None, если кэш устарел.
+    """
+    return cache.get(_test_payload_key(test, variant))
+
+
+def set_test_payload(test, variant, content):
+    """Сохраняет отрендеренный JSON теста под текущей версией вместе со сжатым вариантом"""
+    payload = {
+        'content': content,
+        'gzip': gzip_content(content) if len(content) >= GZIP_MIN_LENGTH else None,
+        'etag': '"%s"' % hashlib.md5(content).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+    cache.set(_test_payload_key(test, variant), payload)
+    return payload
+
+
+def _content_gzip_key(content_hash):
+    return f'learning:content-gzip:{content_hash}'
+
+
+def get_content_gzip(content_hash):
+    """Сжатое gzip содержание материала по его хэшу (ключ не устаревает)"""
+    return cache.get(_content_gzip_key(content_hash))
+
+
+def set_content_gzip(content_hash, content):
+    gzipped = gzip_content(content)
+    cache.set(_content_gzip_key(content_hash), gzipped)
+    return gzipped
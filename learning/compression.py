@@ -0,0 +1,125 @@
+"""
+Сжатие содержания материалов для хранения в базе.
+
+Формат значения в колонке - байт формата и данные:
+    0x00 + UTF-8                       - без сжатия (короткие тексты)
+    0x01 + zlib                        - zlib без словаря
+    0x02 + id словаря (4 байта) + zlib - zlib с предустановленным словарём раздела
+
+Словарь (zdict) обучается по материалам раздела (см. dictionaries.py) и после
+создания не меняется, поэтому значения, сжатые любым словарём, всегда читаются:
+словари загружаются по id и хранятся в памяти процесса.
+"""
+import struct
+import zlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import LRUCache
+
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+FORMAT_ZLIB_DICT = 2
+
+COMPRESSION_LEVEL = 9
+DICTIONARY_ID = struct.Struct('>I')
+
+# id словаря -> данные словаря (строки словарей не изменяются)
+_dictionaries = LRUCache(maxsize=128)
+
+
+class CompressionError(Exception):
+    """Значение в базе не удаётся распаковать"""
+
+
+def compress(text, dictionary=None):
+    """
+    Сжимает текст; dictionary - пара (id, данные словаря) или None.
+    
+    Если сжатие не уменьшает размер, текст хранится как есть.
+    """
+    data = text.encode('utf-8')
+    if dictionary is None:
+        packed = bytes([FORMAT_ZLIB]) + zlib.compress(data, COMPRESSION_LEVEL)
+    else:
+        dictionary_id, zdict = dictionary
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict)
+        packed = (
+            bytes([FORMAT_ZLIB_DICT]) + DICTIONARY_ID.pack(dictionary_id)
+            + compressor.compress(data) + compressor.flush()
+        )
+    if len(packed) > len(data):
+        return bytes([FORMAT_RAW]) + data
+    return packed
+
+
+def decompress(value):
+    """Распаковывает значение колонки в текст"""
+    if isinstance(value, str):
+        # Значение, записанное до перехода на сжатие
+        return value
+    value = bytes(value)
+    if not value:
+        return ''
+    
+    fmt = value[0]
+    if fmt == FORMAT_RAW:
+        data = value[1:]
+    elif fmt == FORMAT_ZLIB:
+        data = zlib.decompress(value[1:])
+    elif fmt == FORMAT_ZLIB_DICT:
+        (dictionary_id,) = DICTIONARY_ID.unpack_from(value, 1)
+        decompressor = zlib.decompressobj(zdict=get_dictionary_data(dictionary_id))
+        data = decompressor.decompress(value[1 + DICTIONARY_ID.size:]) + decompressor.flush()
+    else:
+        raise CompressionError(f'Неизвестный формат сжатия: {fmt}')
+    return data.decode('utf-8')
+
+
+def get_dictionary_data(dictionary_id):
+    """Данные словаря по id (из памяти процесса или из базы)"""
+    from .models import CompressionDictionary
+    
+    data = _dictionaries.get(dictionary_id)
+    if data is None:
+        try:
+            data = bytes(CompressionDictionary.objects.values_list(
+                'data', flat=True
+            ).get(pk=dictionary_id))
+        except CompressionDictionary.DoesNotExist:
+            raise CompressionError(f'Словарь сжатия {dictionary_id} не найден')
+        _dictionaries.set(dictionary_id, data)
+    return data
+
+
+def _active_dictionary_key(section_id):
+    return f'learning:zdict-active:{section_id}'
+
+
+def get_active_dictionary(section_id):
+    """
+    Словарь, которым сжимаются новые материалы раздела: (id, данные) или None.
+    
+    id текущего словаря кэшируется (0 - словаря нет); устаревшее значение
+    безопасно, так как значение в колонке хранит id своего словаря.
+    """
+    from .models import CompressionDictionary
+    
+    dictionary_id = cache.get(_active_dictionary_key(section_id))
+    if dictionary_id is None:
+        dictionary_id = CompressionDictionary.objects.filter(
+            section_id=section_id
+        ).order_by('-pk').values_list('pk', flat=True).first() or 0
+        cache.set(_active_dictionary_key(section_id), dictionary_id)
+    if not dictionary_id:
+        return None
+    return dictionary_id, get_dictionary_data(dictionary_id)
+
+
+def set_active_dictionary(section_id, dictionary_id):
+    """Переключает раздел на новый словарь после фиксации транзакции"""
+    transaction.on_commit(
+        lambda: cache.set(_active_dictionary_key(section_id), dictionary_id)
+    )
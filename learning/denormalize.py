@@ -0,0 +1,60 @@
+"""Проверка и восстановление денормализованных колонок владельца и публикации"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import Section, Material, Test, TestResult
+
+
+def _source(model, foreign_key, field):
+    """Значение колонки источника для UPDATE (коррелированный подзапрос)"""
+    return Subquery(model.objects.filter(pk=OuterRef(foreign_key)).values(field)[:1])
+
+
+def stale_rows():
+    """
+    Строки, в которых копии разошлись с источником.
+    
+    Материалы проверяются раньше тестов, а тесты раньше результатов:
+    каждая копия сверяется с колонкой уровнем выше.
+    """
+    return [
+        (
+            'material.section_owner',
+            Material.objects.exclude(section_owner_id=F('section__owner_id')),
+            {'section_owner_id': _source(Section, 'section_id', 'owner_id')},
+        ),
+        (
+            'test.section_owner/effective_published',
+            Test.objects.filter(
+                ~Q(section_owner_id=F('material__section_owner_id'))
+                | ~Q(effective_published=F('material__is_published'))
+            ),
+            {
+                'section_owner_id': _source(Material, 'material_id', 'section_owner_id'),
+                'effective_published': _source(Material, 'material_id', 'is_published'),
+            },
+        ),
+        (
+            'testresult.owner',
+            TestResult.objects.exclude(owner_id=F('test__section_owner_id')),
+            {'owner_id': _source(Test, 'test_id', 'section_owner_id')},
+        ),
+    ]
+
+
+def sync_denormalized(dry_run=False):
+    """
+    Исправляет копии, которые обошли save() (QuerySet.update, bulk_create, правки в базе).
+    
+    Возвращает число исправленных строк по каждой колонке. При dry_run
+    считаются только прямые расхождения: строки, которые разойдутся после
+    исправления уровня выше, станут видны при следующей проверке.
+    """
+    report = {}
+    with transaction.atomic():
+        for name, queryset, values in stale_rows():
+            if dry_run:
+                report[name] = queryset.count()
+            else:
+                report[name] = queryset.update(**values)
+    return report
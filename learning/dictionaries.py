@@ -0,0 +1,127 @@
+"""
+Обучение словарей сжатия по материалам раздела.
+
+zlib не умеет обучать словари (как zstd --train), поэтому словарь собирается
+из фрагментов текста, которые встречаются сразу в нескольких материалах
+раздела: общие формулировки, термины, шаблоны оформления. zlib ищет совпадения
+в последних 32 КБ, поэтому самые выгодные фрагменты ставятся в конец словаря.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from .compression import compress, set_active_dictionary
+from .models import CompressionDictionary, Material
+
+
+# Размер окна zlib: данные словаря дальше 32 КБ от начала текста не используются
+DICTIONARY_SIZE = 32 * 1024
+DICTIONARY_SIZES = (DICTIONARY_SIZE, 16 * 1024, 8 * 1024, 4 * 1024, 2 * 1024)
+# Сколько символов каждого материала участвует в обучении
+SAMPLE_CHARS = 64 * 1024
+MAX_SAMPLES = 500
+NGRAM_SIZES = (3, 8)
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Собирает словарь из n-грамм слов, встречающихся хотя бы в двух образцах.
+    
+    Фрагменты упорядочиваются по выгоде (число документов × длина) так,
+    что самые выгодные оказываются ближе к концу словаря.
+    """
+    document_frequency = Counter()
+    for text in samples:
+        words = text[:SAMPLE_CHARS].split()
+        grams = set()
+        for n in NGRAM_SIZES:
+            for i in range(len(words) - n + 1):
+                grams.add(' '.join(words[i:i + n]))
+        document_frequency.update(grams)
+    
+    candidates = sorted(
+        (
+            (frequency * len(gram.encode('utf-8')), gram)
+            for gram, frequency in document_frequency.items()
+            if frequency > 1
+        ),
+        reverse=True
+    )
+    chosen = []
+    total = 0
+    for _, gram in candidates:
+        encoded = gram.encode('utf-8') + b' '
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+def compressed_size(texts, dictionary=None):
+    return sum(len(compress(text, dictionary)) for text in texts)
+
+
+def train_section_dictionary(section_id, min_samples=2, dry_run=False):
+    """
+    Обучает словарь раздела и пережимает им материалы раздела.
+    
+    Возвращает отчёт с размерами содержания: исходным, сжатым без словаря
+    и сжатым со словарём. Словарь сохраняется, только если выигрыш больше
+    размера самого словаря.
+    """
+    texts = dict(
+        Material.objects.filter(section_id=section_id).values_list('pk', 'content')[:MAX_SAMPLES]
+    )
+    report = {
+        'section': section_id,
+        'materials': len(texts),
+        'raw': sum(len(text.encode('utf-8')) for text in texts.values()),
+        'zlib': compressed_size(texts.values()),
+        'zlib_dict': None,
+        'dictionary_size': 0,
+        'dictionary': None,
+    }
+    if len(texts) < min_samples:
+        return report
+    
+    # Словарь хранится один раз на раздел и должен окупаться: из словарей
+    # разного размера выбирается дающий наименьший суммарный объём
+    best = None
+    for size in DICTIONARY_SIZES:
+        data = train_dictionary(texts.values(), size=size)
+        if not data:
+            break
+        total = compressed_size(texts.values(), (0, data))
+        if best is None or total + len(data) < best[0] + len(best[1]):
+            best = (total, data)
+    if best is None:
+        return report
+    total, data = best
+    report['zlib_dict'] = total
+    report['dictionary_size'] = len(data)
+    if dry_run or total + len(data) >= report['zlib']:
+        return report
+    
+    with transaction.atomic():
+        dictionary = CompressionDictionary.objects.create(
+            section_id=section_id, data=data, samples=len(texts)
+        )
+        recompress_section(section_id, (dictionary.pk, data))
+        set_active_dictionary(section_id, dictionary.pk)
+    report['dictionary'] = dictionary.pk
+    return report
+
+
+def recompress_section(section_id, dictionary, batch_size=200):
+    """Пережимает содержание всех материалов раздела словарём"""
+    batch = []
+    queryset = Material.objects.filter(section_id=section_id).only('pk', 'content')
+    for material in queryset.iterator(chunk_size=batch_size):
+        # bulk_update записывает готовые байты как есть
+        material.content = compress(material.content, dictionary)
+        batch.append(material)
+        if len(batch) == batch_size:
+            Material.objects.bulk_update(batch, ['content'])
+            batch = []
+    Material.objects.bulk_update(batch, ['content'])
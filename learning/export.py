@@ -0,0 +1,53 @@
+"""Потоковая выгрузка результатов тестов"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Поля выгрузки: (заголовок, путь в values_list)
+RESULT_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('test', 'test_id'),
+    ('test_title', 'test__title'),
+    ('user', 'user_id'),
+    ('user_username', 'user__username'),
+    ('score', 'score'),
+    ('is_passed', 'is_passed'),
+    ('completed_at', 'completed_at'),
+]
+
+
+class _Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку"""
+    
+    def write(self, value):
+        return value
+
+
+def iter_result_rows(queryset, chunk_size=2000):
+    """Строки результатов кортежами values_list, без создания экземпляров моделей"""
+    return queryset.order_by(*queryset.model._meta.ordering).values_list(
+        *[path for _, path in RESULT_EXPORT_FIELDS]
+    ).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in RESULT_EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+        )
+
+
+def stream_jsonl(rows):
+    names = [name for name, _ in RESULT_EXPORT_FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,48 @@
+from django.db import models
+
+from .compression import compress, decompress
+
+
+class CompressedTextField(models.TextField):
+    """
+    Текст, который хранится сжатым в двоичной колонке (см. compression.py).
+    
+    В Python значение всегда str: сжатие при записи и распаковка при чтении
+    прозрачны для моделей, форм и сериализаторов. Модель может определить
+    get_compression_dictionary(), чтобы save() сжимал значение словарём.
+    Поиск по содержимому (icontains и т.п.) по такой колонке невозможен.
+    """
+    
+    def get_internal_type(self):
+        return 'BinaryField'
+    
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress(value)
+    
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(value)
+        return super().to_python(value)
+    
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if isinstance(value, str):
+            get_dictionary = getattr(model_instance, 'get_compression_dictionary', None)
+            return compress(value, get_dictionary() if get_dictionary else None)
+        return value
+    
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        if isinstance(value, str):
+            return compress(value)
+        return bytes(value)
+    
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
@@ -0,0 +1,182 @@
+"""Проверка ответов на тест"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .cache import LRUCache, get_test_version
+from .models import Question, Answer, TestResult, UserAnswer, TestStats
+from .routers import use_primary
+from .sqlite import run_serialized
+
+
+QuestionKey = namedtuple('QuestionKey', ['points', 'question_type', 'answer_ids', 'correct_ids'])
+
+# Сколько секунд ключ теста живёт в памяти процесса
+ANSWER_KEY_TTL = 60
+
+# Ключи последних использованных тестов: test_id -> (версия, ключ)
+_answer_keys = LRUCache(maxsize=256, ttl=ANSWER_KEY_TTL)
+
+
+class GradingError(Exception):
+    """Ошибка проверки: ответы не соответствуют тесту или тест уже пройден"""
+
+
+def load_answer_key(test):
+    """Загружает ключ теста (вопросы и варианты ответов) двумя запросами"""
+    answers = {}
+    correct = {}
+    for question_id, answer_id, is_correct in Answer.objects.filter(
+        question__test=test
+    ).values_list('question_id', 'id', 'is_correct').order_by():
+        answers.setdefault(question_id, set()).add(answer_id)
+        if is_correct:
+            correct.setdefault(question_id, set()).add(answer_id)
+    
+    return {
+        question_id: QuestionKey(
+            points=points,
+            question_type=question_type,
+            answer_ids=frozenset(answers.get(question_id, ())),
+            correct_ids=frozenset(correct.get(question_id, ())),
+        )
+        for question_id, points, question_type in Question.objects.filter(
+            test=test
+        ).values_list('id', 'points', 'question_type').order_by()
+    }
+
+
+def get_answer_key(test):
+    """
+    Возвращает ключ теста без обращения к таблицам вопросов и ответов.
+    
+    Ключ ищется сначала в памяти процесса, затем в кэше Django; оба уровня
+    проверяются по версии теста (Test.updated_at), которую обновляют
+    сигналы Question/Answer. Ключ загружается из основной базы: тест мог быть
+    прочитан с реплики, но вопросы под его версией не должны быть старше её.
+    """
+    version = get_test_version(test)
+    cached = _answer_keys.get(test.pk)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    cache_key = f'learning:answer-key:{test.pk}:{version}'
+    key = cache.get(cache_key)
+    if key is None:
+        with use_primary():
+            key = load_answer_key(test)
+        cache.set(cache_key, key)
+    _answer_keys.set(test.pk, (version, key))
+    return key
+
+
+def is_answer_correct(question, selected):
+    """Проверяет набор выбранных вариантов по ключу вопроса"""
+    if question.question_type == 'single':
+        # Для одного ответа - должен быть выбран ровно один правильный
+        return len(selected) == 1 and selected == question.correct_ids
+    # Для нескольких ответов - все правильные должны быть выбраны и никаких лишних
+    return selected == question.correct_ids
+
+
+def grade_answers(key, answers_data):
+    """
+    Проверяет ответы в памяти.
+    
+    Возвращает набранные баллы, максимум баллов по отвеченным вопросам
+    и список (question_id, selected_answer_ids, is_correct) для сохранения.
+    """
+    total_points = 0
+    max_points = 0
+    selections = []
+    seen = set()
+    
+    for answer_data in answers_data:
+        question_id = answer_data['question_id']
+        selected_answer_ids = answer_data['answer_ids']
+        
+        question = key.get(question_id)
+        if question is None:
+            raise GradingError(f'Вопрос с id {question_id} не найден')
+        if question_id in seen:
+            raise GradingError(f'Повторный ответ на вопрос {question_id}')
+        seen.add(question_id)
+        
+        selected = set(selected_answer_ids)
+        if len(selected) != len(selected_answer_ids) or not selected <= question.answer_ids:
+            raise GradingError(f'Некоторые ответы для вопроса {question_id} не найдены')
+        
+        max_points += question.points
+        
+        is_correct = is_answer_correct(question, selected)
+        if is_correct:
+            total_points += question.points
+        
+        selections.append((question_id, selected_answer_ids, is_correct))
+    
+    return total_points, max_points, selections
+
+
+def submit_test(test, user, answers_data):
+    """
+    Проверяет ответы пользователя и сохраняет результат одной транзакцией.
+    
+    Ответы пользователя и связи с выбранными вариантами записываются
+    через bulk_create, поэтому число запросов не зависит от числа вопросов.
+    """
+    key = get_answer_key(test)
+    
+    def write():
+        with transaction.atomic():
+            # Проверяем, не проходил ли пользователь тест ранее
+            if TestResult.objects.filter(test=test, user=user.pk).exists():
+                raise GradingError('Вы уже проходили этот тест')
+            
+            total_points, max_points, selections = grade_answers(key, answers_data)
+            
+            # Вычисляем процент правильных ответов
+            if max_points > 0:
+                score = int((total_points / max_points) * 100)
+            else:
+                score = 0
+            
+            test_result = TestResult.objects.create(
+                test=test,
+                user_id=user.pk,
+                score=score,
+                is_passed=score >= test.passing_score
+            )
+            
+            user_answers = UserAnswer.objects.bulk_create([
+                UserAnswer(test_result=test_result, question_id=question_id)
+                for question_id, _, _ in selections
+            ])
+            
+            through = UserAnswer.selected_answers.through
+            through.objects.bulk_create([
+                through(useranswer_id=user_answer.pk, answer_id=answer_id)
+                for user_answer, (_, answer_ids, _) in zip(user_answers, selections)
+                for answer_id in answer_ids
+            ])
+            
+            TestStats.record(
+                test.pk, test_result.score, test_result.is_passed,
+                answers=selections, version=get_test_version(test)
+            )
+        return test_result
+    
+    try:
+        # На SQLite писатели идут по очереди с повтором при блокировке базы
+        test_result = run_serialized(write)
+    except IntegrityError:
+        # Параллельная отправка того же теста тем же пользователем нарушает
+        # уникальность (test, user); остальные ошибки (например, тест или вопрос
+        # удалили во время проверки) не скрываются
+        with use_primary():
+            submitted = TestResult.objects.filter(test=test, user=user.pk).exists()
+        if submitted:
+            raise GradingError('Вы уже проходили этот тест')
+        raise
+    
+    return test_result
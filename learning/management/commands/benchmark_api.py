@@ -0,0 +1,92 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+from django.utils import timezone
+
+from learning.benchmark import (
+    QUERY_CEILINGS, build_endpoints, compare_reports, measure_endpoint, seed_dataset
+)
+
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число SQL-запросов, задержку (p50/p95) и пиковую память '
+        'для всех маршрутов API на синтетических данных'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', type=int, default=5)
+        parser.add_argument('--materials', type=int, default=4, help='Материалов в разделе')
+        parser.add_argument('--questions', type=int, default=20, help='Вопросов в тесте')
+        parser.add_argument('--students', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20, help='Вызовов каждого эндпоинта')
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+        parser.add_argument('--compare', help='JSON-отчёт предыдущего запуска для сравнения')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый относительный рост p95 при сравнении'
+        )
+    
+    def handle(self, *args, **options):
+        # Замеры идут на отдельной тестовой базе и с кэшем в памяти процесса:
+        # рабочая база и общий кэш рабочих процессов не затрагиваются
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                report = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт сохранён в {options['output']}")
+        
+        problems = [
+            f"{name}: {metrics['queries']} запросов (потолок {QUERY_CEILINGS[name]})"
+            for name, metrics in report['endpoints'].items()
+            if metrics['queries'] > QUERY_CEILINGS[name]
+        ]
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                problems += compare_reports(json.load(f), report, options['tolerance'])
+        if problems:
+            raise CommandError('Обнаружены регрессии:\n' + '\n'.join(problems))
+    
+    def run_benchmark(self, options):
+        params = {
+            key: options[key]
+            for key in ('sections', 'materials', 'questions', 'students')
+        }
+        data = seed_dataset(**params)
+        
+        endpoints = {}
+        self.stdout.write(f"{'эндпоинт':<22}{'HTTP':>6}{'запросы':>9}{'p50, мс':>10}{'p95, мс':>10}{'память, КБ':>12}")
+        for name, method, prepare in build_endpoints(data):
+            metrics = measure_endpoint(method, prepare, repeat=options['repeat'])
+            endpoints[name] = metrics
+            self.stdout.write(
+                f"{name:<22}{metrics['status']:>6}{metrics['queries']:>9}"
+                f"{metrics['p50_ms']:>10}{metrics['p95_ms']:>10}{metrics['peak_memory_kb']:>12}"
+            )
+        
+        return {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': params,
+            'endpoints': endpoints,
+        }
@@ -0,0 +1,60 @@
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from learning.revocation import BloomFilter
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет фильтр Блума отозванных токенов на синтетических jti: '
+        'память, скорость добавления, задержку проверки и долю ложных срабатываний'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=10_000_000, help='Выпущенных токенов')
+        parser.add_argument(
+            '--revoked', type=float, default=0.1,
+            help='Доля отозванных токенов (попадает в фильтр)'
+        )
+        parser.add_argument('--lookups', type=int, default=100_000, help='Проверок неотозванных jti')
+        parser.add_argument(
+            '--error-rate', type=float,
+            default=getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.001)
+        )
+    
+    def handle(self, *args, **options):
+        revoked = int(options['tokens'] * options['revoked'])
+        bloom = BloomFilter(revoked, options['error_rate'])
+        self.stdout.write(
+            f"Выпущено {options['tokens']}, отозвано {revoked}; фильтр: "
+            f"{bloom.size} бит ({len(bloom.bits) / 2 ** 20:.1f} МБ), хэшей {bloom.hashes}"
+        )
+        
+        started = time.perf_counter()
+        for _ in range(revoked):
+            bloom.add(uuid.uuid4().hex)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Добавление: {revoked / elapsed:,.0f} jti/с')
+        
+        # Проверки неотозванных токенов: ложное срабатывание означает запрос к базе
+        latencies = []
+        false_positives = 0
+        for _ in range(options['lookups']):
+            jti = uuid.uuid4().hex
+            started = time.perf_counter_ns()
+            hit = jti in bloom
+            latencies.append(time.perf_counter_ns() - started)
+            false_positives += hit
+        latencies.sort()
+        self.stdout.write(
+            f"Проверка: p50 {statistics.median(latencies) / 1000:.1f} мкс, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] / 1000:.1f} мкс"
+        )
+        self.stdout.write(
+            f"Ложные срабатывания (запросы к базе): {false_positives / options['lookups']:.4%} "
+            f"при расчётных {options['error_rate']:.4%}"
+        )
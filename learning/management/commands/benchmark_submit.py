@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from learning.benchmark import measure_concurrent_submits, seed_dataset
+
+
+# Профиль SQLite по умолчанию: журнал DELETE, без PRAGMA, очереди писателей
+# и постоянных соединений
+BASELINE = {
+    'SQLITE_PRAGMAS': {},
+    'SQLITE_SERIALIZE_WRITES': False,
+    'CONN_MAX_AGE': 0,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет, сколько прохождений теста в секунду выдерживает база при '
+        'параллельной отправке из нескольких потоков, с профилем SQLite и без него'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Потоков, отправляющих тест')
+        parser.add_argument('--readers', type=int, default=2, help='Потоков, читающих тест')
+        parser.add_argument('--submits', type=int, default=200, help='Всего прохождений')
+        parser.add_argument('--questions', type=int, default=20, help='Вопросов в тесте')
+        parser.add_argument(
+            '--profile', choices=['baseline', 'tuned', 'both'], default='both',
+            help='baseline - настройки SQLite по умолчанию, tuned - профиль из settings'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+    
+    def handle(self, *args, **options):
+        tuned = {
+            'SQLITE_PRAGMAS': settings.SQLITE_PRAGMAS,
+            'SQLITE_SERIALIZE_WRITES': settings.SQLITE_SERIALIZE_WRITES,
+            'CONN_MAX_AGE': connection.settings_dict['CONN_MAX_AGE'],
+        }
+        profiles = ['baseline', 'tuned'] if options['profile'] == 'both' else [options['profile']]
+        
+        report = {}
+        self.stdout.write(
+            f"{'профиль':<10}{'успешно':>9}{'ошибки':>8}{'submit/с':>10}"
+            f"{'чтений/с':>10}{'p50, мс':>10}{'p95, мс':>10}"
+        )
+        for name in profiles:
+            profile = BASELINE if name == 'baseline' else tuned
+            metrics = self.run_profile(profile, options)
+            report[name] = metrics
+            self.stdout.write(
+                f"{name:<10}{metrics['succeeded']:>9}{metrics['submits'] - metrics['succeeded']:>8}"
+                f"{metrics['submits_per_second']:>10}{metrics['reads_per_second']:>10}"
+                f"{metrics['p50_ms']:>10}{metrics['p95_ms']:>10}"
+            )
+        
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт сохранён в {options['output']}")
+    
+    def run_profile(self, profile, options):
+        """
+        Замер на отдельной файловой базе: WAL и блокировки между соединениями
+        не работают в базе в памяти, которую Django создаёт для тестов.
+        """
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        directory = tempfile.mkdtemp(prefix='benchmark-submit-')
+        test_settings['NAME'] = os.path.join(directory, 'db.sqlite3')
+        connection.settings_dict['CONN_MAX_AGE'] = profile['CONN_MAX_AGE']
+        
+        # Ошибки блокировки в профиле baseline считаются в отчёте, трассировки не нужны
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        setup_test_environment()
+        try:
+            with override_settings(
+                SQLITE_PRAGMAS=profile['SQLITE_PRAGMAS'],
+                SQLITE_SERIALIZE_WRITES=profile['SQLITE_SERIALIZE_WRITES'],
+            ):
+                connection.close()
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    data = seed_dataset(
+                        sections=1, materials=1, questions=options['questions'], students=1
+                    )
+                    return measure_concurrent_submits(
+                        data, threads=options['threads'], submits=options['submits'],
+                        readers=options['readers']
+                    )
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+            request_logger.disabled = False
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+            test_settings['NAME'] = old_test_name
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from learning.models import User, Section, Material, Test, TestResult
+
+
+def access_paths():
+    """Основные пути доступа API и индексы, которые должен выбрать планировщик"""
+    return [
+        (
+            'Опубликованные разделы',
+            Section.objects.filter(is_published=True).order_by(*Section._meta.ordering),
+            {'learning_section_pub_idx', 'learning_section_visible_idx'},
+        ),
+        (
+            'Опубликованные материалы',
+            Material.objects.filter(is_published=True).order_by(*Material._meta.ordering),
+            {'learning_material_pub_idx'},
+        ),
+        (
+            'Опубликованные материалы раздела',
+            Material.objects.filter(section_id=1, is_published=True).order_by(*Material._meta.ordering),
+            {'learning_material_secpub_idx', 'learning_material_visible_idx'},
+        ),
+        (
+            'Тесты опубликованных материалов',
+            Test.objects.filter(effective_published=True).order_by(*Test._meta.ordering),
+            {'learning_test_pub_idx'},
+        ),
+        (
+            'Результаты тестов преподавателя',
+            TestResult.objects.filter(owner_id=1).order_by('-completed_at', '-id'),
+            {'learning_result_owner_idx'},
+        ),
+        (
+            'Результаты теста',
+            TestResult.objects.filter(test_id=1).order_by(*TestResult._meta.ordering),
+            {'learning_result_test_idx'},
+        ),
+        (
+            'Курсор по результатам',
+            TestResult.objects.order_by('-completed_at', '-id'),
+            {'learning_result_completed_idx'},
+        ),
+        (
+            'Курсор по пользователям',
+            User.objects.order_by('-created_at', '-id'),
+            {'learning_user_created_idx'},
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Проверяет по EXPLAIN, что фильтры видимости и пагинация используют составные индексы'
+    
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленьких таблицах PostgreSQL предпочитает Seq Scan;
+                # проверяем, что индекс применим, а не что он дешевле
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            
+            for name, queryset, expected in access_paths():
+                plan = queryset.explain()
+                used = sorted(index for index in expected if index in plan)
+                if used:
+                    self.stdout.write(f'{name}: {", ".join(used)}')
+                else:
+                    failures.append(name)
+                    self.stdout.write(f'{name}: индекс не используется\n{plan}')
+        
+        if failures:
+            raise CommandError('Индексы не используются: ' + ', '.join(failures))
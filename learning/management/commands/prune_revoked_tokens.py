@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from learning.revocation import revocation_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истёкшие токены из blacklist пачками (как flushexpiredtokens) '
+        'и пересобирает фильтр Блума отозванных токенов во всех процессах'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+    
+    def handle(self, *args, **options):
+        deleted = revocation_store.prune_expired(batch_size=options['batch_size'])
+        self.stdout.write(f'Удалено истёкших токенов: {deleted}')
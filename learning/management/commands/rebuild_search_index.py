@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from learning.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс материалов, разделов и вопросов'
+    
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(f'Индекс перестроен ({connection.vendor}: {type(backend).__name__})')
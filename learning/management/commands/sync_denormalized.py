@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from learning.denormalize import sync_denormalized
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные колонки (владелец раздела, публикация материала) '
+        'с исходными таблицами и исправляет расхождения'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только подсчитать расхождения; код возврата 1, если они есть'
+        )
+    
+    def handle(self, *args, **options):
+        report = sync_denormalized(dry_run=options['check'])
+        for name, count in report.items():
+            self.stdout.write(f'{name}: {count}')
+        
+        if options['check'] and any(report.values()):
+            raise CommandError('Денормализованные колонки расходятся с исходными')
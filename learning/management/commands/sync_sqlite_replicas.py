@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from learning.routers import replica_health
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик через backup API SQLite '
+        '(для локальной проверки чтения с реплик)'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование каждые N секунд (0 - один раз)'
+        )
+    
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite; для других СУБД используйте их репликацию')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены (переменная окружения DATABASE_REPLICAS)')
+        
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                self.sync(primary, alias)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+    
+    def sync(self, primary, alias):
+        started = time.perf_counter()
+        primary.ensure_connection()
+        # Соединение Django с репликой закрывается, чтобы не держать старый снимок
+        connections[alias].close()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            # backup копирует согласованный снимок, не блокируя запись надолго
+            primary.connection.backup(target, pages=1024)
+        finally:
+            target.close()
+        available = replica_health.check(alias)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'{alias}: скопирована за {elapsed:.1f} мс, доступна: {available}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from learning.dictionaries import train_section_dictionary
+from learning.models import Section
+
+
+class Command(BaseCommand):
+    help = (
+        'Обучает словари zlib по материалам разделов и пережимает ими содержание; '
+        'выводит размер содержания без сжатия, со сжатием и со словарём'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--section', type=int, action='append', help='id раздела (можно несколько)')
+        parser.add_argument(
+            '--min-samples', type=int, default=2,
+            help='Минимальное число материалов в разделе для обучения словаря'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только оценить выигрыш, не сохраняя словари'
+        )
+    
+    def handle(self, *args, **options):
+        section_ids = options['section'] or Section.objects.values_list('pk', flat=True)
+        self.stdout.write(
+            f"{'раздел':>8} {'материалов':>11} {'исходно':>12} {'zlib':>12} "
+            f"{'со словарём':>12} {'словарь, Б':>11} {'id':>6}"
+        )
+        for section_id in section_ids:
+            report = train_section_dictionary(
+                section_id, min_samples=options['min_samples'], dry_run=options['dry_run']
+            )
+            zlib_dict = report['zlib_dict'] if report['zlib_dict'] is not None else '-'
+            dictionary = report['dictionary'] or '-'
+            self.stdout.write(
+                f"{report['section']:>8} {report['materials']:>11} {report['raw']:>12} "
+                f"{report['zlib']:>12} {zlib_dict:>12} {report['dictionary_size']:>11} {dictionary:>6}"
+            )
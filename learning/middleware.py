@@ -0,0 +1,106 @@
+"""Middleware API: сжатие ответов и выбор базы данных для чтения"""
+import gzip
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from .routers import (
+    begin_request, current_state, end_request, mark_primary_write, replica_health
+)
+
+
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+
+# Короткие ответы не сжимаются (как в GZipMiddleware Django)
+GZIP_MIN_LENGTH = 200
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """
+    GZipMiddleware, который не сжимает частичные ответы.
+    
+    Content-Range ответа 206 описывает байты несжатого содержания,
+    поэтому такой ответ отдаётся как есть.
+    """
+    
+    def process_response(self, request, response):
+        if response.status_code == 206 or response.has_header('Content-Range'):
+            return response
+        return super().process_response(request, response)
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Cookie после записи: браузер и админка читают из основной базы (см. routers.py)
+PRIMARY_PIN_COOKIE = 'primary_pin'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов.
+    
+    Изменяющие запросы целиком работают с основной базой. После успешной
+    записи пользователь (по id из токена и по cookie) читает из основной базы
+    REPLICA_STICKY_SECONDS секунд, пока реплики догоняют основную.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        writing = request.method not in SAFE_METHODS
+        token = begin_request(pinned=writing or PRIMARY_PIN_COOKIE in request.COOKIES)
+        state = current_state()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        
+        if writing and response.status_code < 400 and settings.DATABASE_REPLICAS:
+            if state.user_id is not None:
+                mark_primary_write(state.user_id)
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+    
+    def process_exception(self, request, exception):
+        # Ошибка базы при чтении с реплики исключает реплику до следующей проверки
+        state = current_state()
+        if (
+            isinstance(exception, DatabaseError) and state is not None
+            and state.replica in settings.DATABASE_REPLICAS
+        ):
+            replica_health.mark_failed(state.replica)
+        return None
+
+
+def accepts_gzip(request):
+    return bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def gzip_content(content):
+    """Сжатие для кэшируемых ответов: без времени в заголовке, результат детерминирован"""
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def encoded_response(request, content, gzipped, content_type, etag):
+    """
+    Ответ из заранее подготовленных вариантов: сжатого gzipped (или None) и исходного.
+    
+    Сжатый вариант отдаётся с Content-Encoding, поэтому GZipMiddleware
+    не сжимает его повторно; ETag ослабляется, как это делает GZipMiddleware.
+    """
+    if gzipped is not None and accepts_gzip(request):
+        response = HttpResponse(gzipped, content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+        response['ETag'] = f'W/{etag}' if etag.startswith('"') else etag
+    else:
+        response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0002_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                fields=["section", "is_published", "order"],
+                name="learning_material_visible_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["order", "-created_at"],
+                name="learning_material_pub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["section", "order", "-created_at"],
+                name="learning_material_secpub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="section",
+            index=models.Index(
+                fields=["is_published", "-created_at"],
+                name="learning_section_visible_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="section",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-created_at"],
+                name="learning_section_pub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="testresult",
+            index=models.Index(
+                fields=["test", "-completed_at"], name="learning_result_test_idx"
+            ),
+        ),
+    ]
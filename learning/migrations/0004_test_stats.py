@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import learning.models
+
+
+def backfill_test_stats(apps, schema_editor):
+    TestResult = apps.get_model("learning", "TestResult")
+    TestStats = apps.get_model("learning", "TestStats")
+
+    stats = {}
+    for test_id, score, is_passed in (
+        TestResult.objects.order_by()
+        .values_list("test_id", "score", "is_passed")
+        .iterator()
+    ):
+        item = stats.setdefault(
+            test_id, TestStats(test_id=test_id, score_histogram=[0] * 101)
+        )
+        item.attempts += 1
+        item.passed += 1 if is_passed else 0
+        item.score_sum += score
+        item.score_histogram[score] += 1
+    TestStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0003_visibility_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TestStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Попыток"),
+                ),
+                (
+                    "passed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Успешных попыток"
+                    ),
+                ),
+                (
+                    "score_sum",
+                    models.BigIntegerField(default=0, verbose_name="Сумма баллов"),
+                ),
+                (
+                    "score_histogram",
+                    models.JSONField(
+                        default=learning.models.empty_score_histogram,
+                        verbose_name="Гистограмма баллов",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "test",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to="learning.test",
+                        verbose_name="Тест",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика теста",
+                "verbose_name_plural": "Статистика тестов",
+            },
+        ),
+        migrations.RunPython(backfill_test_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_denormalized(apps, schema_editor):
+    Section = apps.get_model("learning", "Section")
+    Material = apps.get_model("learning", "Material")
+    Test = apps.get_model("learning", "Test")
+    TestResult = apps.get_model("learning", "TestResult")
+
+    Material.objects.update(
+        section_owner_id=Subquery(
+            Section.objects.filter(pk=OuterRef("section_id")).values("owner_id")[:1]
+        )
+    )
+    materials = Material.objects.filter(pk=OuterRef("material_id"))
+    Test.objects.update(
+        section_owner_id=Subquery(materials.values("section_owner_id")[:1]),
+        effective_published=Subquery(materials.values("is_published")[:1]),
+    )
+    TestResult.objects.update(
+        owner_id=Subquery(
+            Test.objects.filter(pk=OuterRef("test_id")).values("section_owner_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("learning", "0004_test_stats"),
+    ]
+
+    operations = [
+        # Колонки добавляются допускающими NULL, заполняются и только затем
+        # становятся обязательными
+        migrations.AddField(
+            model_name="material",
+            name="section_owner",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец раздела",
+            ),
+        ),
+        migrations.AddField(
+            model_name="test",
+            name="effective_published",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Материал опубликован"
+            ),
+        ),
+        migrations.AddField(
+            model_name="test",
+            name="section_owner",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец раздела",
+            ),
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="owner",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец теста",
+            ),
+        ),
+        migrations.RunPython(backfill_denormalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="material",
+            name="section_owner",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец раздела",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="test",
+            name="section_owner",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец раздела",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="testresult",
+            name="owner",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец теста",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="test",
+            index=models.Index(
+                condition=models.Q(("effective_published", True)),
+                fields=["-created_at"],
+                name="learning_test_pub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="testresult",
+            index=models.Index(
+                fields=["owner", "-completed_at", "-id"],
+                name="learning_result_owner_idx",
+            ),
+        ),
+    ]
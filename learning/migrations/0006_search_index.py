@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:10
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE learning_material_fts USING fts5("
+    "title, content, questions, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE learning_section_fts USING fts5("
+    "title, description, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO learning_material_fts (rowid, title, content, questions) "
+    "SELECT m.id, m.title, m.content, ("
+    " SELECT group_concat(q.text, ' ')"
+    " FROM learning_question q JOIN learning_test t ON q.test_id = t.id"
+    " WHERE t.material_id = m.id"
+    ") FROM learning_material m",
+    "INSERT INTO learning_section_fts (rowid, title, description) "
+    "SELECT s.id, s.title, coalesce(s.description, '') FROM learning_section s",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS learning_material_fts",
+    "DROP TABLE IF EXISTS learning_section_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE learning_material_search ("
+    " material_id bigint PRIMARY KEY"
+    " REFERENCES learning_material (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    " document tsvector NOT NULL)",
+    "CREATE INDEX learning_material_search_idx ON learning_material_search USING GIN (document)",
+    "CREATE TABLE learning_section_search ("
+    " section_id bigint PRIMARY KEY"
+    " REFERENCES learning_section (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    " document tsvector NOT NULL)",
+    "CREATE INDEX learning_section_search_idx ON learning_section_search USING GIN (document)",
+    "INSERT INTO learning_material_search (material_id, document) "
+    "SELECT m.id,"
+    " setweight(to_tsvector('russian', m.title), 'A')"
+    " || setweight(to_tsvector('russian', m.content), 'C')"
+    " || setweight(to_tsvector('russian', coalesce(("
+    "  SELECT string_agg(q.text, ' ')"
+    "  FROM learning_question q JOIN learning_test t ON q.test_id = t.id"
+    "  WHERE t.material_id = m.id"
+    " ), '')), 'B') "
+    "FROM learning_material m",
+    "INSERT INTO learning_section_search (section_id, document) "
+    "SELECT s.id,"
+    " setweight(to_tsvector('russian', s.title), 'A')"
+    " || setweight(to_tsvector('russian', coalesce(s.description, '')), 'C') "
+    "FROM learning_section s",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TABLE IF EXISTS learning_material_search",
+    "DROP TABLE IF EXISTS learning_section_search",
+]
+
+
+def run_statements(statements):
+    def operation(apps, schema_editor):
+        # Индекс создаётся только для СУБД с поддержкой полнотекстового поиска,
+        # для остальных search.py использует icontains
+        statements_for_vendor = statements.get(schema_editor.connection.vendor, [])
+        for statement in statements_for_vendor:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0005_denormalized_owner"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run_statements(
+                {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}
+            ),
+        ),
+    ]
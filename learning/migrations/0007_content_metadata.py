@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:40
+
+import hashlib
+
+from django.db import migrations, models
+
+EXCERPT_LENGTH = 280
+
+
+def content_metadata(content):
+    # Копия learning.models.content_metadata на момент миграции
+    encoded = content.encode("utf-8")
+    head = content[: EXCERPT_LENGTH * 4]
+    text = " ".join(head.split())
+    if len(text) > EXCERPT_LENGTH or len(content) > len(head):
+        cut = text[:EXCERPT_LENGTH]
+        boundary = cut.rfind(" ")
+        if boundary > EXCERPT_LENGTH // 2:
+            cut = cut[:boundary]
+        text = cut.rstrip() + "…"
+    return len(encoded), hashlib.sha256(encoded).hexdigest(), text
+
+
+def backfill_content_metadata(apps, schema_editor):
+    Material = apps.get_model("learning", "Material")
+    batch = []
+    for material in Material.objects.only("id", "content").iterator(chunk_size=500):
+        (
+            material.content_length,
+            material.content_hash,
+            material.excerpt,
+        ) = content_metadata(material.content)
+        batch.append(material)
+        if len(batch) == 500:
+            Material.objects.bulk_update(
+                batch, ["content_length", "content_hash", "excerpt"]
+            )
+            batch = []
+    Material.objects.bulk_update(batch, ["content_length", "content_hash", "excerpt"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0006_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="material",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="SHA-256 содержания",
+            ),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="content_length",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Размер содержания (байт)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="material",
+            name="excerpt",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=281,
+                verbose_name="Начало содержания",
+            ),
+        ),
+        migrations.RunPython(backfill_content_metadata, migrations.RunPython.noop),
+    ]
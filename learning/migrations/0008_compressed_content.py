@@ -0,0 +1,115 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import learning.fields
+
+
+def compress_existing_content(apps, schema_editor):
+    # Значения сжимаются без словаря; словари разделов обучает команда
+    # train_compression_dictionaries, которая пережимает материалы
+    Material = apps.get_model("learning", "Material")
+    batch = []
+    for material in Material.objects.only("id", "content").iterator(chunk_size=500):
+        material.content_compressed = material.content
+        batch.append(material)
+        if len(batch) == 500:
+            Material.objects.bulk_update(batch, ["content_compressed"])
+            batch = []
+    Material.objects.bulk_update(batch, ["content_compressed"])
+
+
+def decompress_content(apps, schema_editor):
+    Material = apps.get_model("learning", "Material")
+    batch = []
+    for material in Material.objects.only("id", "content_compressed").iterator(
+        chunk_size=500
+    ):
+        material.content = material.content_compressed
+        batch.append(material)
+        if len(batch) == 500:
+            Material.objects.bulk_update(batch, ["content"])
+            batch = []
+    Material.objects.bulk_update(batch, ["content"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0007_content_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompressionDictionary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.BinaryField(verbose_name="Данные словаря")),
+                (
+                    "samples",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Материалов в обучении"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "section",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="compression_dictionaries",
+                        to="learning.section",
+                        verbose_name="Раздел",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Словарь сжатия",
+                "verbose_name_plural": "Словари сжатия",
+                "ordering": ["-created_at"],
+            },
+        ),
+        # Текст переносится в новую двоичную колонку, а не через AlterField:
+        # приведение text -> bytea/BLOB на уровне СУБД не сжимает данные
+        migrations.AddField(
+            model_name="material",
+            name="content_compressed",
+            field=learning.fields.CompressedTextField(
+                null=True, verbose_name="Содержание"
+            ),
+        ),
+        # При откате старая колонка восстанавливается допускающей NULL
+        # и заполняется до возврата ограничения
+        migrations.AlterField(
+            model_name="material",
+            name="content",
+            field=models.TextField(null=True, verbose_name="Содержание"),
+        ),
+        migrations.RunPython(compress_existing_content, decompress_content),
+        migrations.RemoveField(
+            model_name="material",
+            name="content",
+        ),
+        migrations.RenameField(
+            model_name="material",
+            old_name="content_compressed",
+            new_name="content",
+        ),
+        migrations.AlterField(
+            model_name="material",
+            name="content",
+            field=learning.fields.CompressedTextField(verbose_name="Содержание"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0008_compressed_content"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="teststats",
+            name="item_counts",
+            field=models.JSONField(default=dict, verbose_name="Счётчики заданий"),
+        ),
+        migrations.AddField(
+            model_name="teststats",
+            name="item_version",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=40,
+                verbose_name="Версия теста для счётчиков",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0009_item_counts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["updated_at"], name="learning_user_updated_idx"),
+        ),
+    ]
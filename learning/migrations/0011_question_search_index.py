@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:00
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE learning_question_fts USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO learning_question_fts (rowid, text) "
+    "SELECT q.id, q.text FROM learning_question q",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS learning_question_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE learning_question_search ("
+    " question_id bigint PRIMARY KEY"
+    " REFERENCES learning_question (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    " document tsvector NOT NULL)",
+    "CREATE INDEX learning_question_search_idx ON learning_question_search USING GIN (document)",
+    "INSERT INTO learning_question_search (question_id, document) "
+    "SELECT q.id, to_tsvector('russian', q.text) FROM learning_question q",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TABLE IF EXISTS learning_question_search",
+]
+
+
+def run_statements(statements):
+    def operation(apps, schema_editor):
+        # Индекс создаётся только для СУБД с поддержкой полнотекстового поиска,
+        # для остальных search.py использует icontains
+        statements_for_vendor = statements.get(schema_editor.connection.vendor, [])
+        for statement in statements_for_vendor:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0010_user_updated_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run_statements(
+                {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:15
+
+import hashlib
+
+from django.db import migrations
+
+CREATE_CONTENTLESS = (
+    "CREATE VIRTUAL TABLE learning_material_fts USING fts5("
+    "title, content, questions, content='', tokenize='unicode61 remove_diacritics 2')"
+)
+
+CREATE_DOCUMENTS = (
+    "CREATE TABLE learning_material_fts_doc ("
+    " material_id integer PRIMARY KEY,"
+    " title text NOT NULL,"
+    " questions text NOT NULL,"
+    " content_hash varchar(64) NOT NULL)"
+)
+
+CREATE_REGULAR = (
+    "CREATE VIRTUAL TABLE learning_material_fts USING fts5("
+    "title, content, questions, tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def material_documents(apps):
+    """Документы материалов порциями, как в search.material_documents"""
+    Material = apps.get_model("learning", "Material")
+    Question = apps.get_model("learning", "Question")
+    chunk = []
+    materials = Material.objects.order_by("pk").values_list("pk", "title", "content")
+    for row in materials.iterator(chunk_size=200):
+        chunk.append(row)
+        if len(chunk) == 200:
+            yield with_questions(Question, chunk)
+            chunk = []
+    if chunk:
+        yield with_questions(Question, chunk)
+
+
+def with_questions(Question, rows):
+    questions = {}
+    for material_id, text in (
+        Question.objects.filter(test__material_id__in=[pk for pk, _, _ in rows])
+        .order_by("test__material_id", "order")
+        .values_list("test__material_id", "text")
+    ):
+        questions.setdefault(material_id, []).append(text)
+    return [
+        (pk, title, content, " ".join(questions.get(pk, ())))
+        for pk, title, content in rows
+    ]
+
+
+def make_contentless(apps, schema_editor):
+    # На PostgreSQL индекс хранит только tsvector, переделывать нечего
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE learning_material_fts")
+    schema_editor.execute(CREATE_CONTENTLESS)
+    schema_editor.execute(CREATE_DOCUMENTS)
+    with schema_editor.connection.cursor() as cursor:
+        for documents in material_documents(apps):
+            cursor.executemany(
+                "INSERT INTO learning_material_fts (rowid, title, content, questions) "
+                "VALUES (%s, %s, %s, %s)",
+                documents,
+            )
+            cursor.executemany(
+                "INSERT INTO learning_material_fts_doc "
+                "(material_id, title, questions, content_hash) VALUES (%s, %s, %s, %s)",
+                [
+                    (
+                        pk,
+                        title,
+                        questions,
+                        hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                    )
+                    for pk, title, content, questions in documents
+                ],
+            )
+
+
+def make_regular(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE learning_material_fts_doc")
+    schema_editor.execute("DROP TABLE learning_material_fts")
+    schema_editor.execute(CREATE_REGULAR)
+    with schema_editor.connection.cursor() as cursor:
+        for documents in material_documents(apps):
+            cursor.executemany(
+                "INSERT INTO learning_material_fts (rowid, title, content, questions) "
+                "VALUES (%s, %s, %s, %s)",
+                documents,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learning", "0011_question_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(make_contentless, make_regular),
+    ]
@@ -0,0 +1,76 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class ConditionalRequestMixin:
+    """
+    Валидаторы ETag/Last-Modified для list и retrieve.
+    
+    Валидаторы считаются дешёвыми агрегатами (Max('updated_at') и число строк)
+    до сериализации; если клиент прислал совпадающие If-None-Match или
+    If-Modified-Since, сразу возвращается 304.
+    """
+    
+    def get_object(self):
+        # Валидаторы и сериализация используют один и тот же объект
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+    
+    def get_validator_queryset(self):
+        """Queryset без аннотаций, по которому считаются валидаторы списка"""
+        return self.filter_queryset(self.get_queryset())
+    
+    def get_list_validator_aggregates(self):
+        return {
+            'last_modified': Max('updated_at'),
+            'total': Count('pk', distinct=True),
+        }
+    
+    def get_list_validators(self, queryset):
+        return queryset.order_by().aggregate(**self.get_list_validator_aggregates())
+    
+    def get_object_validators(self, obj):
+        return {'last_modified': obj.updated_at, 'pk': obj.pk}
+    
+    def conditional_response(self, request, validators, get_response):
+        last_modified = max(
+            (value for value in validators.values() if hasattr(value, 'timestamp')),
+            default=None
+        )
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        # Список зависит от пользователя, параметров запроса и формата ответа
+        key = repr((
+            request.get_full_path(),
+            request.user.pk,
+            request.accepted_renderer.format,
+            sorted(validators.items()),
+        ))
+        etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+        
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    def list(self, request, *args, **kwargs):
+        validators = self.get_list_validators(self.get_validator_queryset())
+        return self.conditional_response(
+            request, validators,
+            lambda: super(ConditionalRequestMixin, self).list(request, *args, **kwargs)
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_object_validators(self.get_object())
+        return self.conditional_response(
+            request, validators,
+            lambda: super(ConditionalRequestMixin, self).retrieve(request, *args, **kwargs)
+        )
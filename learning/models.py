@@ -1,7 +1,42 @@
+import functools
+import hashlib
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .compression import get_active_dictionary
+from .fields import CompressedTextField
+from .sqlite import run_serialized
+
+
+def serialized_write(method):
+    """
+    Выполняет save() или delete() модели одной транзакцией через очередь
+    писателей SQLite (см. sqlite.py): вместе с объектом записываются его
+    денормализованные копии и изменения из сигналов.
+    
+    Перед повтором восстанавливается состояние объекта, которое изменил
+    откатившийся INSERT.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        adding, pk = self._state.adding, self.pk
+        
+        def write():
+            self._state.adding, self.pk = adding, pk
+            with transaction.atomic():
+                return method(self, *args, **kwargs)
+        
+        return run_serialized(write)
+    return wrapper
+
+
+# Сведения о содержании материала, которые отдаются в списках вместо content
+CONTENT_METADATA_FIELDS = ('content_length', 'content_hash', 'excerpt')
+EXCERPT_LENGTH = 280
+
 
 class User(AbstractUser):
     """Расширенная модель пользователя с ролями"""
@@ -26,10 +61,25 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset-пагинация списка пользователей
+            models.Index(fields=['-created_at', '-id'], name='learning_user_created_idx'),
+            # Проверка изменений пользователей (UserChangeFeed)
+            models.Index(fields=['updated_at'], name='learning_user_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
     
+    def save(self, *args, **kwargs):
+        # Один INSERT или UPDATE без денормализованных копий: нужна только очередь писателей
+        run_serialized(lambda: super(User, self).save(*args, **kwargs))
+    
+    @serialized_write
+    def delete(self, *args, **kwargs):
+        # Каскад по результатам и пересчёт статистики (signals.py) - одна транзакция записи
+        return super().delete(*args, **kwargs)
+    
     @property
     def is_admin(self):
         return self.role == 'admin' or self.is_superuser
@@ -43,6 +93,36 @@ class User(AbstractUser):
         return self.role == 'student'
 
 
+def snapshot_fields(instance, *attnames):
+    """Значения полей при загрузке из базы (для проверки изменений в save)"""
+    instance._loaded_values = {attname: instance.__dict__.get(attname) for attname in attnames}
+
+
+def fields_changed(instance, *attnames):
+    loaded = getattr(instance, '_loaded_values', {})
+    return any(loaded.get(attname) != getattr(instance, attname) for attname in attnames)
+
+
+def content_metadata(content):
+    """
+    Размер содержания в байтах UTF-8, его SHA-256 и начало текста.
+    
+    Размер в байтах соответствует заголовкам Range эндпоинта content.
+    """
+    encoded = content.encode('utf-8')
+    # Для начала текста достаточно первых символов, весь текст не разбирается
+    head = content[:EXCERPT_LENGTH * 4]
+    text = ' '.join(head.split())
+    if len(text) > EXCERPT_LENGTH or len(content) > len(head):
+        cut = text[:EXCERPT_LENGTH]
+        # Обрезаем по границе слова, если она есть во второй половине
+        boundary = cut.rfind(' ')
+        if boundary > EXCERPT_LENGTH // 2:
+            cut = cut[:boundary]
+        text = cut.rstrip() + '…'
+    return len(encoded), hashlib.sha256(encoded).hexdigest(), text
+
+
 class Section(models.Model):
     """Раздел курса"""
     title = models.CharField(max_length=200, verbose_name='Название')
@@ -61,9 +141,48 @@ class Section(models.Model):
         verbose_name = 'Раздел'
         verbose_name_plural = 'Разделы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_published', '-created_at'], name='learning_section_visible_idx'),
+            # Студенты видят только опубликованные разделы
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_published=True),
+                name='learning_section_pub_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.title
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        snapshot_fields(instance, 'owner_id')
+        return instance
+    
+    @serialized_write
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding and fields_changed(self, 'owner_id'):
+            # Копии владельца в материалах, тестах и результатах раздела
+            Material.objects.filter(section=self).update(section_owner_id=self.owner_id)
+            Test.objects.filter(material__section=self).update(section_owner_id=self.owner_id)
+            TestResult.objects.filter(test__material__section=self).update(owner_id=self.owner_id)
+        snapshot_fields(self, 'owner_id')
+    
+    @serialized_write
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+
+
+class MaterialQuerySet(models.QuerySet):
+
+    def with_test_flag(self):
+        """Добавляет аннотацию has_test без обращения к тесту каждого материала"""
+        return self.annotate(
+            has_test=models.Exists(Test.objects.filter(material=models.OuterRef('pk')))
+        )
 
 
 class Material(models.Model):
@@ -75,19 +194,103 @@ class Material(models.Model):
         verbose_name='Раздел'
     )
     title = models.CharField(max_length=200, verbose_name='Название')
-    content = models.TextField(verbose_name='Содержание')
+    # Хранится сжатым zlib со словарём раздела (см. compression.py)
+    content = CompressedTextField(verbose_name='Содержание')
+    # Заполняются в save() по content; списки читают их вместо content
+    content_length = models.PositiveIntegerField(default=0, editable=False, verbose_name='Размер содержания (байт)')
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name='SHA-256 содержания')
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH + 1, blank=True, editable=False, verbose_name='Начало содержания')
     order = models.IntegerField(default=0, verbose_name='Порядок')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     is_published = models.BooleanField(default=False, verbose_name='Опубликован')
+    # Копия section.owner для фильтров видимости без JOIN (см. sync_denormalized)
+    section_owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        verbose_name='Владелец раздела'
+    )
+    
+    objects = MaterialQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Материал'
         verbose_name_plural = 'Материалы'
         ordering = ['order', '-created_at']
+        indexes = [
+            models.Index(fields=['section', 'is_published', 'order'], name='learning_material_visible_idx'),
+            # Студенты видят только опубликованные материалы (в том числе внутри раздела)
+            models.Index(
+                fields=['order', '-created_at'],
+                condition=models.Q(is_published=True),
+                name='learning_material_pub_idx'
+            ),
+            models.Index(
+                fields=['section', 'order', '-created_at'],
+                condition=models.Q(is_published=True),
+                name='learning_material_secpub_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.section.title} - {self.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        snapshot_fields(instance, 'section_id', 'section_owner_id', 'is_published')
+        return instance
+    
+    @serialized_write
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if self.section_owner_id is None or fields_changed(self, 'section_id'):
+            self.section_owner_id = self.section.owner_id
+        # Материал, загруженный с defer('content'), сохраняется без пересчёта
+        if 'content' not in self.get_deferred_fields():
+            self.content_length, self.content_hash, self.excerpt = content_metadata(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = {*update_fields, *CONTENT_METADATA_FIELDS}
+        super().save(*args, **kwargs)
+        if not adding and fields_changed(self, 'section_owner_id', 'is_published'):
+            Test.objects.filter(material=self).update(
+                section_owner_id=self.section_owner_id,
+                effective_published=self.is_published,
+            )
+            if fields_changed(self, 'section_owner_id'):
+                TestResult.objects.filter(test__material=self).update(owner_id=self.section_owner_id)
+        snapshot_fields(self, 'section_id', 'section_owner_id', 'is_published')
+    
+    @serialized_write
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+    
+    def get_compression_dictionary(self):
+        return get_active_dictionary(self.section_id)
+
+
+class CompressionDictionary(models.Model):
+    """Словарь zlib, обученный по материалам раздела (неизменяемый)"""
+    section = models.ForeignKey(
+        Section,
+        on_delete=models.CASCADE,
+        related_name='compression_dictionaries',
+        verbose_name='Раздел'
+    )
+    data = models.BinaryField(verbose_name='Данные словаря')
+    samples = models.PositiveIntegerField(default=0, verbose_name='Материалов в обучении')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        verbose_name = 'Словарь сжатия'
+        verbose_name_plural = 'Словари сжатия'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.section.title} #{self.pk} ({len(self.data)} байт)"
 
 
 class Test(models.Model):
@@ -107,14 +310,56 @@ class Test(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    # Копии material.section.owner и material.is_published для фильтров видимости
+    section_owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        verbose_name='Владелец раздела'
+    )
+    effective_published = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Материал опубликован'
+    )
     
     class Meta:
         verbose_name = 'Тест'
         verbose_name_plural = 'Тесты'
         ordering = ['-created_at']
+        indexes = [
+            # Студенты видят только тесты опубликованных материалов
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(effective_published=True),
+                name='learning_test_pub_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.material.title} - {self.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        snapshot_fields(instance, 'material_id', 'section_owner_id')
+        return instance
+    
+    @serialized_write
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if self.section_owner_id is None or fields_changed(self, 'material_id'):
+            self.section_owner_id = self.material.section_owner_id
+            self.effective_published = self.material.is_published
+        super().save(*args, **kwargs)
+        if not adding and fields_changed(self, 'section_owner_id'):
+            TestResult.objects.filter(test=self).update(owner_id=self.section_owner_id)
+        snapshot_fields(self, 'material_id', 'section_owner_id')
+    
+    @serialized_write
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
 
 
 class Question(models.Model):
@@ -174,6 +419,21 @@ class Answer(models.Model):
         return f"{self.question.text[:30]} - {self.text[:30]}"
 
 
+class TestResultQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Удаляет результаты и пересчитывает статистику затронутых тестов"""
+        test_ids = set(self.order_by().values_list('test_id', flat=True).distinct())
+        
+        def write():
+            with transaction.atomic():
+                deleted = super(TestResultQuerySet, self).delete()
+                TestStats.rebuild(test_ids)
+            return deleted
+        
+        return run_serialized(write)
+
+
 class TestResult(models.Model):
     """Результат прохождения теста"""
     test = models.ForeignKey(
@@ -194,15 +454,49 @@ class TestResult(models.Model):
     )
     is_passed = models.BooleanField(default=False, verbose_name='Пройден')
     completed_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата прохождения')
+    # Копия test.section_owner: фильтр преподавателя без JOIN через три таблицы
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        verbose_name='Владелец теста'
+    )
+    
+    objects = TestResultQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Результат теста'
         verbose_name_plural = 'Результаты тестов'
         ordering = ['-completed_at']
         unique_together = [['test', 'user']]
+        indexes = [
+            # Keyset-пагинация списка результатов
+            models.Index(fields=['-completed_at', '-id'], name='learning_result_completed_idx'),
+            # Результаты конкретного теста (?test=) в порядке прохождения
+            models.Index(fields=['test', '-completed_at'], name='learning_result_test_idx'),
+            # Результаты тестов преподавателя в порядке курсора
+            models.Index(fields=['owner', '-completed_at', '-id'], name='learning_result_owner_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.test.title} ({self.score}%)"
+    
+    def save(self, *args, **kwargs):
+        if self.owner_id is None:
+            self.owner_id = self.test.section_owner_id
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        # Каскадные удаления (тест, раздел, пользователь) идут мимо этого метода
+        # и пересчитывают статистику целиком, см. signals.py
+        def write():
+            with transaction.atomic():
+                deleted = super(TestResult, self).delete(*args, **kwargs)
+                TestStats.record(self.test_id, self.score, self.is_passed, count=-1)
+            return deleted
+        
+        return run_serialized(write)
 
 
 class UserAnswer(models.Model):
@@ -230,3 +524,144 @@ class UserAnswer(models.Model):
     
     def __str__(self):
         return f"{self.test_result.user.username} - {self.question.text[:30]}"
+
+
+def empty_score_histogram():
+    return [0] * 101
+
+
+class TestStats(models.Model):
+    """Статистика прохождения теста, обновляемая при каждой отправке"""
+    test = models.OneToOneField(
+        Test,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Тест'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    passed = models.PositiveIntegerField(default=0, verbose_name='Успешных попыток')
+    score_sum = models.BigIntegerField(default=0, verbose_name='Сумма баллов')
+    # score_histogram[score] - число попыток с баллом score (0..100)
+    score_histogram = models.JSONField(default=empty_score_histogram, verbose_name='Гистограмма баллов')
+    # Счётчики анализа заданий по вопросам (см. add_answers) и версия теста, для которой
+    # они посчитаны; пустая версия - счётчики устарели и пересчитываются при чтении
+    item_counts = models.JSONField(default=dict, verbose_name='Счётчики заданий')
+    item_version = models.CharField(max_length=40, blank=True, default='', verbose_name='Версия теста для счётчиков')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    
+    class Meta:
+        verbose_name = 'Статистика теста'
+        verbose_name_plural = 'Статистика тестов'
+    
+    def __str__(self):
+        return f"{self.test.title} ({self.attempts})"
+    
+    @classmethod
+    def record(cls, test_id, score, is_passed, count=1, answers=None, version=None):
+        """
+        Учитывает результат (count=1) или его удаление (count=-1).
+        
+        answers - ответы результата (question_id, selected_ids, is_correct) для
+        счётчиков анализа заданий, version - версия теста, по которой они проверены.
+        Строка статистики блокируется до конца текущей транзакции,
+        поэтому параллельные отправки не теряют обновлений.
+        """
+        queryset = cls.objects.select_for_update()
+        if count > 0:
+            stats, created = queryset.get_or_create(test_id=test_id)
+        else:
+            # Статистика могла быть удалена вместе с тестом
+            stats = queryset.filter(test_id=test_id).first()
+            if stats is None:
+                return None
+            created = False
+        stats.attempts += count
+        stats.passed += count if is_passed else 0
+        stats.score_sum += count * score
+        stats.score_histogram[score] += count
+        if count > 0 and answers is not None and (created or stats.item_version == version):
+            stats.item_version = version
+            stats.add_answers(score, answers)
+        else:
+            # Ответы удалённого результата не загружаются: счётчики пересчитаются при чтении
+            stats.item_version = ''
+        stats.save()
+        return stats
+    
+    def add_answers(self, score, answers):
+        """
+        Добавляет ответы одной попытки в счётчики заданий.
+        
+        По каждому вопросу хранится число ответов, число верных ответов по баллу
+        попытки (для групп дискриминации) и число выборов каждого варианта.
+        """
+        for question_id, selected_ids, is_correct in answers:
+            item = self.item_counts.setdefault(
+                str(question_id), {'answered': 0, 'correct_by_score': {}, 'selected': {}}
+            )
+            item['answered'] += 1
+            if is_correct:
+                by_score = item['correct_by_score']
+                by_score[str(score)] = by_score.get(str(score), 0) + 1
+            selected = item['selected']
+            for answer_id in selected_ids:
+                selected[str(answer_id)] = selected.get(str(answer_id), 0) + 1
+    
+    @classmethod
+    def rebuild(cls, test_ids):
+        """
+        Пересчитывает статистику тестов по их результатам.
+        
+        Используется после массового удаления результатов: одна агрегация
+        по всем тестам вместо обновления строки статистики на каждый результат.
+        """
+        test_ids = set(test_ids)
+        if not test_ids:
+            return
+        with transaction.atomic():
+            stats = {
+                item.test_id: item
+                for item in cls.objects.select_for_update().filter(test_id__in=test_ids)
+            }
+            if not stats:
+                return
+            for item in stats.values():
+                item.attempts = item.passed = item.score_sum = 0
+                item.score_histogram = empty_score_histogram()
+                item.item_version = ''
+                item.updated_at = timezone.now()
+            for test_id, score, attempts, passed in TestResult.objects.filter(
+                test_id__in=stats
+            ).values_list('test_id', 'score').annotate(
+                attempts=models.Count('pk'),
+                passed=models.Count('pk', filter=models.Q(is_passed=True)),
+            ).order_by():
+                item = stats[test_id]
+                item.attempts += attempts
+                item.passed += passed
+                item.score_sum += score * attempts
+                item.score_histogram[score] += attempts
+            cls.objects.bulk_update(
+                stats.values(),
+                ['attempts', 'passed', 'score_sum', 'score_histogram', 'item_version', 'updated_at']
+            )
+    
+    @property
+    def pass_rate(self):
+        return round(self.passed * 100 / self.attempts, 2) if self.attempts else 0
+    
+    @property
+    def mean_score(self):
+        return round(self.score_sum / self.attempts, 2) if self.attempts else 0
+    
+    def percentile(self, percent):
+        """Балл, ниже или равный которому набрали percent% попыток"""
+        if not self.attempts:
+            return 0
+        threshold = self.attempts * percent / 100
+        seen = 0
+        for score, count in enumerate(self.score_histogram):
+            seen += count
+            if seen >= threshold and seen > 0:
+                return score
+        return 100
@@ -0,0 +1,22 @@
+"""Определение владельца объекта без обхода цепочки внешних ключей"""
+from .models import Section, Material, Test, TestResult
+
+
+# Колонка с id владельца раздела; у материалов, тестов и результатов
+# это денормализованные копии Section.owner (см. learning/denormalize.py)
+OWNER_FIELDS = {
+    Section: 'owner_id',
+    Material: 'section_owner_id',
+    Test: 'section_owner_id',
+    TestResult: 'owner_id',
+}
+
+
+def get_owner_id(obj):
+    """Возвращает id владельца раздела, к которому относится объект"""
+    return getattr(obj, OWNER_FIELDS[type(obj)])
+
+
+def is_owner(user, obj):
+    """Является ли пользователь владельцем объекта или администратором"""
+    return user.is_admin or get_owner_id(obj) == user.pk
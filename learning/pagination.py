@@ -0,0 +1,69 @@
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация.
+    
+    Порядок берётся из атрибута cursor_ordering представления; он должен
+    совпадать с составным индексом модели, тогда глубокие страницы стоят
+    столько же, сколько первая.
+    """
+    
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+
+class SelectablePagination(BasePagination):
+    """
+    Постраничная пагинация по умолчанию с курсорным режимом по запросу.
+    
+    Курсорный режим включается параметром ?pagination=cursor (или наличием
+    ?cursor=...) либо атрибутом представления pagination_mode = 'cursor'.
+    """
+    mode_query_param = 'pagination'
+    
+    def __init__(self):
+        self.page_paginator = PageNumberPagination()
+        self.cursor_paginator = KeysetPagination()
+        self.active = self.page_paginator
+    
+    def use_cursor(self, request, view):
+        if self.cursor_paginator.cursor_query_param in request.query_params:
+            return True
+        mode = request.query_params.get(self.mode_query_param)
+        if mode is None:
+            mode = getattr(view, 'pagination_mode', 'page')
+        return mode == 'cursor'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request, view):
+            self.active = self.cursor_paginator
+        else:
+            self.active = self.page_paginator
+        return self.active.paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+    
+    def get_paginated_response_schema(self, schema):
+        return self.active.get_paginated_response_schema(schema)
+    
+    def to_html(self):
+        return self.active.to_html()
+    
+    def get_results(self, data):
+        return self.active.get_results(data)
+    
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.page_paginator.get_schema_operation_parameters(view)
+            + self.cursor_paginator.get_schema_operation_parameters(view)
+        )
+    
+    @property
+    def display_page_controls(self):
+        return getattr(self.active, 'display_page_controls', False)
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .ownership import OWNER_FIELDS, is_owner
+
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Разрешение для администраторов - полный доступ, остальные - только чтение"""
@@ -17,13 +19,9 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return request.user.is_authenticated
         
-        # Проверяем владельца в зависимости от типа объекта
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user or request.user.is_admin
-        elif hasattr(obj, 'section'):
-            return obj.section.owner == request.user or request.user.is_admin
-        elif hasattr(obj, 'material'):
-            return obj.material.section.owner == request.user or request.user.is_admin
+        # Владелец сравнивается по id, без загрузки связанных объектов
+        if type(obj) in OWNER_FIELDS:
+            return is_owner(request.user, obj)
         
         return request.user.is_admin
 
@@ -49,7 +47,7 @@ class IsStudentOrOwner(permissions.BasePermission):
             return request.user.is_authenticated
         
         # Владельцы могут видеть результаты своих тестов
-        if hasattr(obj, 'test') and hasattr(obj.test, 'material'):
-            return obj.test.material.section.owner == request.user or request.user.is_admin
+        if hasattr(obj, 'test') and type(obj) in OWNER_FIELDS:
+            return is_owner(request.user, obj)
         
         return request.user.is_admin
@@ -0,0 +1,122 @@
+"""Массовое создание пользователей"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .models import User
+from .sqlite import run_serialized
+
+
+# Ниже этого числа паролей пул процессов не окупает свой запуск
+POOL_THRESHOLD = 64
+BATCH_SIZE = 1000
+
+
+class ProvisioningError(Exception):
+    """Ошибка массового создания пользователей"""
+
+
+def _init_worker():
+    # При запуске процессов через spawn настройки Django нужно загрузить заново
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Хэширует пароли параллельно в пуле процессов.
+    
+    PBKDF2 занимает процессор, поэтому потоки здесь не помогают из-за GIL.
+    """
+    passwords = list(passwords)
+    if len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def read_user_rows(data, upload=None):
+    """Строки пользователей из загруженного CSV-файла или из JSON {"users": [...]}"""
+    if upload is not None:
+        try:
+            reader = csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+            # Пустые ячейки означают значение по умолчанию
+            return [
+                {key: value for key, value in row.items() if key and value}
+                for row in reader
+            ]
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ProvisioningError(f'Не удалось прочитать CSV: {exc}')
+    
+    rows = data.get('users') if hasattr(data, 'get') else None
+    if not isinstance(rows, list):
+        raise ProvisioningError('Передайте CSV-файл в поле file или JSON со списком users')
+    return rows
+
+
+def split_valid_rows(rows, serializer_class):
+    """
+    Проверяет строки в памяти.
+    
+    Уникальность логинов проверяется одним запросом для всех строк,
+    а не по запросу на строку. Возвращает пары (номер строки, данные)
+    и список ошибок по строкам.
+    """
+    valid = []
+    errors = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        serializer = serializer_class(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'errors': serializer.errors})
+            continue
+        username = serializer.validated_data['username']
+        if username in seen:
+            errors.append({'row': number, 'errors': {'username': ['Логин повторяется в файле']}})
+            continue
+        seen.add(username)
+        valid.append((number, serializer.validated_data))
+    
+    taken = set()
+    usernames = [attrs['username'] for _, attrs in valid]
+    for start in range(0, len(usernames), BATCH_SIZE):
+        taken.update(User.objects.filter(
+            username__in=usernames[start:start + BATCH_SIZE]
+        ).values_list('username', flat=True))
+    
+    if taken:
+        errors.extend(
+            {'row': number, 'errors': {'username': ['Пользователь с таким логином уже существует']}}
+            for number, attrs in valid if attrs['username'] in taken
+        )
+        valid = [(number, attrs) for number, attrs in valid if attrs['username'] not in taken]
+    
+    errors.sort(key=lambda error: error['row'])
+    return valid, errors
+
+
+def create_users(validated_rows):
+    """Создаёт пользователей одной транзакцией через bulk_create"""
+    attrs_list = [dict(attrs) for attrs in validated_rows]
+    hashes = hash_passwords(attrs.pop('password') for attrs in attrs_list)
+    users = [
+        User(password=password_hash, **attrs)
+        for attrs, password_hash in zip(attrs_list, hashes)
+    ]
+    
+    def write():
+        with transaction.atomic():
+            return User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    
+    try:
+        return run_serialized(write)
+    except IntegrityError:
+        # Логин заняли параллельно с проверкой
+        raise ProvisioningError('Часть логинов была занята во время импорта, повторите запрос')
@@ -0,0 +1,41 @@
+"""Разбор заголовка Range (RFC 7233) для частичной выдачи содержимого"""
+import re
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Диапазон лежит за пределами содержимого (ответ 416)"""
+
+
+def parse_range(header, size):
+    """
+    Возвращает границы (start, end) включительно для одного диапазона байт.
+    
+    None - заголовка нет или он не поддерживается (несколько диапазонов,
+    другие единицы): по RFC такой Range игнорируется и отдаётся всё содержимое.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
@@ -0,0 +1,16 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """
+    text/plain для эндпоинтов, которые отдают готовый текст (HttpResponse);
+    через рендерер проходят только ошибки DRF.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
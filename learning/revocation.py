@@ -0,0 +1,225 @@
+"""Хранилище отозванных refresh-токенов: фильтр Блума в памяти поверх таблицы blacklist"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from .routers import use_primary
+from .sqlite import run_serialized
+
+
+class BloomFilter:
+    """
+    Фильтр Блума над строками.
+    
+    Размер битового массива и число хэш-функций подбираются по ожидаемому
+    числу элементов и допустимой доле ложных срабатываний. Позиции
+    вычисляются двойным хэшированием одного дайджеста blake2b.
+    """
+    
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hashes)]
+    
+    def add(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+    
+    def __len__(self):
+        return self.count
+    
+    @property
+    def is_full(self):
+        return self.count > self.capacity
+
+
+_REVOKED_KEY = 'learning:revocation:revoked'
+_GENERATION_KEY = 'learning:revocation:generation'
+
+
+def _increment(key):
+    """Увеличивает общий счётчик атомарно (cache.incr), создавая его при отсутствии"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def _read_state():
+    """
+    Счётчик отзывов и поколение фильтра из общего кэша.
+    
+    Отсутствующие ключи (очистка или вытеснение кэша) создаются заново, поэтому
+    значения отличаются от запомненных процессами и те сверяются с базой.
+    """
+    state = cache.get_many([_REVOKED_KEY, _GENERATION_KEY])
+    if _REVOKED_KEY not in state:
+        cache.add(_REVOKED_KEY, 0, timeout=None)
+        state[_REVOKED_KEY] = cache.get(_REVOKED_KEY)
+    if _GENERATION_KEY not in state:
+        cache.add(_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        state[_GENERATION_KEY] = cache.get(_GENERATION_KEY)
+    return state[_REVOKED_KEY], state[_GENERATION_KEY]
+
+
+class RevocationStore:
+    """
+    Проверка отзыва токена за O(1) без запроса к базе в обычном случае.
+    
+    Фильтр Блума содержит jti всех отозванных токенов. Промах по фильтру
+    означает, что токен не отозван, только пока фильтр актуален: общий счётчик
+    отзывов в кэше Django не изменился и с последней сверки с базой прошло
+    меньше REVOCATION_SYNC_SECONDS. Иначе перед ответом подгружаются новые
+    строки BlacklistedToken. Попадание проверяется по индексированной таблице
+    (ложные срабатывания редки).
+    
+    Строки читаются по возрастанию id от отметки, которая сдвигается только за
+    строки старше REVOCATION_SYNC_OVERLAP: так подгружаются и транзакции,
+    зафиксированные позже строк с большим id. Строки после отметки
+    запоминаются, чтобы не учитывать их в фильтре дважды.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._generation = None
+        self._revoked = None
+        self._synced_at = -math.inf
+        self._watermark = 0
+        self._recent = set()
+    
+    def _capacity(self):
+        return getattr(settings, 'REVOCATION_BLOOM_CAPACITY', 1_000_000)
+    
+    def _error_rate(self):
+        return getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.001)
+    
+    def _load(self, bloom):
+        settled_before = aware_utcnow() - timedelta(seconds=settings.REVOCATION_SYNC_OVERLAP)
+        watermark = self._watermark
+        rows = BlacklistedToken.objects.filter(pk__gt=watermark).order_by('pk').values_list(
+            'pk', 'token__jti', 'blacklisted_at'
+        )
+        for pk, jti, blacklisted_at in rows.iterator(chunk_size=10000):
+            if pk not in self._recent:
+                bloom.add(jti)
+                self._recent.add(pk)
+            if blacklisted_at < settled_before:
+                watermark = pk
+        self._watermark = watermark
+        self._recent = {pk for pk in self._recent if pk > watermark}
+    
+    def _rebuild(self, generation):
+        total = BlacklistedToken.objects.count()
+        bloom = BloomFilter(max(self._capacity(), total * 2), self._error_rate())
+        self._watermark = 0
+        self._recent = set()
+        self._load(bloom)
+        self._bloom = bloom
+        self._generation = generation
+    
+    def sync(self):
+        """Сверяет фильтр с базой, если он мог устареть"""
+        revoked, generation = _read_state()
+        with self._lock:
+            stale = (
+                revoked is None
+                or revoked != self._revoked
+                or time.monotonic() - self._synced_at >= settings.REVOCATION_SYNC_SECONDS
+            )
+            if self._bloom is not None and generation == self._generation and not stale:
+                return
+            # Счётчик прочитан до запроса: отзывы после него изменят счётчик снова
+            synced_at = time.monotonic()
+            with use_primary():
+                if self._bloom is None or generation != self._generation:
+                    self._rebuild(generation)
+                else:
+                    self._load(self._bloom)
+                    if self._bloom.is_full:
+                        self._rebuild(generation)
+            self._revoked = revoked
+            self._synced_at = synced_at
+    
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self._bloom:
+            return False
+        with use_primary():
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+    
+    def revoke(self, jti, token, expires_at, user_id=None):
+        """Добавляет токен в blacklist, а после коммита - в фильтр и в общий счётчик"""
+        def write():
+            with transaction.atomic():
+                # Транзакция начинается с записи: в SQLite она сразу ждёт блокировку
+                # записи (busy_timeout), а не получает "database is locked" при
+                # повышении блокировки после чтения
+                OutstandingToken.objects.bulk_create([OutstandingToken(
+                    jti=jti, token=token, expires_at=expires_at, user_id=user_id,
+                )], ignore_conflicts=True)
+                outstanding = OutstandingToken.objects.get(jti=jti)
+                blacklisted, _ = BlacklistedToken.objects.get_or_create(token=outstanding)
+                transaction.on_commit(lambda: self._revoked_committed(jti, blacklisted.pk))
+            return blacklisted
+        
+        return run_serialized(write)
+    
+    def _revoked_committed(self, jti, pk):
+        with self._lock:
+            if self._bloom is not None and pk > self._watermark and pk not in self._recent:
+                self._bloom.add(jti)
+                self._recent.add(pk)
+        _increment(_REVOKED_KEY)
+    
+    def prune_expired(self, batch_size=10000):
+        """
+        Удаляет истёкшие токены пачками и просит процессы пересобрать фильтр.
+        
+        Возвращает число удалённых токенов.
+        """
+        deleted = 0
+        now = aware_utcnow()
+        while True:
+            batch = list(OutstandingToken.objects.filter(
+                expires_at__lte=now
+            ).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=batch).delete()
+                OutstandingToken.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+        # Устаревший фильтр остаётся верным (лишние jti дают только ложные
+        # срабатывания), поэтому поколение - признак пересборки, а не счётчик
+        cache.set(_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        return deleted
+
+
+revocation_store = RevocationStore()
@@ -0,0 +1,175 @@
+"""
+Чтение с реплик базы данных.
+
+Реплики (settings.DATABASE_REPLICAS) используются только для безопасных
+HTTP-запросов (GET/HEAD/OPTIONS), которые проходят через
+ReplicaPinningMiddleware; записи, транзакции внутри изменяющих запросов,
+команды и shell работают с основной базой. После собственной записи
+пользователь читает из основной базы REPLICA_STICKY_SECONDS секунд, чтобы
+сразу видеть свои изменения (например, результат теста после submit).
+"""
+import contextvars
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+class RoutingState:
+    """Состояние маршрутизации текущего запроса"""
+    
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.user_id = None
+        self.sticky = None
+        self.replica = None
+
+
+_state = contextvars.ContextVar('learning_db_routing', default=None)
+
+
+def _sticky_key(user_id):
+    return f'learning:primary-until:{user_id}'
+
+
+def begin_request(pinned):
+    """Включает чтение с реплик для запроса; pinned - читать только из основной базы"""
+    return _state.set(RoutingState(pinned))
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def current_state():
+    return _state.get()
+
+
+def set_request_user(user_id):
+    """Запоминает пользователя запроса (после аутентификации) для проверки его записей"""
+    state = _state.get()
+    if state is not None and state.user_id != user_id:
+        state.user_id = user_id
+        state.sticky = None
+
+
+def mark_primary_write(user_id):
+    """Пользователь читает из основной базы, пока реплики могут отставать от его записи"""
+    until = time.time() + settings.REPLICA_STICKY_SECONDS
+    cache.set(_sticky_key(user_id), until, timeout=math.ceil(settings.REPLICA_STICKY_SECONDS))
+
+
+def _is_sticky(state):
+    if state.user_id is None:
+        return False
+    if state.sticky is None:
+        # Проверяется один раз за запрос
+        until = cache.get(_sticky_key(state.user_id))
+        state.sticky = until is not None and until > time.time()
+    return state.sticky
+
+
+@contextmanager
+def use_primary():
+    """Читать из основной базы внутри блока (например, сразу после записи)"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = pinned
+
+
+class ReplicaHealth:
+    """
+    Доступность реплик в процессе.
+    
+    Реплика проверяется запросом не чаще раза в interval секунд;
+    недоступная реплика (ошибка проверки или запроса) исключается на retry секунд.
+    """
+    
+    def __init__(self, interval, retry):
+        self.interval = interval
+        self.retry = retry
+        self._checked_at = {}
+        self._down_until = {}
+        self._lock = threading.Lock()
+    
+    def is_available(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(alias, 0) > now:
+                return False
+            due = now - self._checked_at.get(alias, -math.inf) >= self.interval
+            if due:
+                self._checked_at[alias] = now
+        if due:
+            return self.check(alias)
+        return True
+    
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                # Пустой файл SQLite тоже открывается, поэтому проверяется таблица миграций
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        except DatabaseError:
+            self.mark_failed(alias)
+            return False
+        with self._lock:
+            self._down_until.pop(alias, None)
+        return True
+    
+    def mark_failed(self, alias):
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + self.retry
+        connections[alias].close()
+
+
+replica_health = ReplicaHealth(
+    interval=getattr(settings, 'REPLICA_HEALTH_INTERVAL', 30),
+    retry=getattr(settings, 'REPLICA_RETRY_SECONDS', 30),
+)
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов - на реплику, всё остальное - в основную базу"""
+    
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if _is_sticky(state):
+            return DEFAULT_DB_ALIAS
+        
+        # Все чтения запроса идут в одну реплику, чтобы данные были согласованы
+        if state.replica is None or (
+            state.replica != DEFAULT_DB_ALIAS and not replica_health.is_available(state.replica)
+        ):
+            replicas = [
+                alias for alias in settings.DATABASE_REPLICAS
+                if replica_health.is_available(alias)
+            ]
+            state.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return state.replica
+    
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с данными
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,565 @@
+"""
+Полнотекстовый поиск по материалам, разделам и вопросам.
+
+Индекс хранится в базе рядом с данными: FTS5 на SQLite, tsvector с GIN-индексом
+на PostgreSQL (таблицы создают миграции 0006_search_index и
+0011_question_search_index). Для остальных СУБД используется icontains без
+индекса. Индекс обновляется сигналами при сохранении и удалении материалов,
+разделов и вопросов (см. signals.py); содержание материалов хранится сжатым,
+поэтому их документы собираются в Python, а индекс материалов на SQLite не
+хранит их текст (фрагменты строятся в Python). Индекс вопросов используется
+поиском в админке.
+"""
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .compression import decompress
+from .models import Material, Question, Test
+
+
+logger = logging.getLogger(__name__)
+
+# Движки размечают найденные слова служебными символами; после экранирования
+# текста они заменяются на <mark>, поэтому разметка из содержимого не попадает в ответ
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_WORDS = 16
+MAX_TERMS = 10
+
+# Поля, по которым строится фрагмент, если его не вернул движок
+TEXT_FIELDS = {
+    'material': ('title', 'content'),
+    'section': ('title', 'description'),
+}
+
+
+def parse_terms(query):
+    """Слова запроса без операторов поисковых движков"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _subquery(queryset):
+    """SQL и параметры запроса id видимых объектов"""
+    return queryset.order_by().values('pk').query.sql_with_params()
+
+
+def material_documents(material_ids=None, chunk_size=200):
+    """
+    Документы материалов порциями: списки (id, название, содержание, текст вопросов).
+    
+    Содержание хранится сжатым (см. compression.py), поэтому документы
+    собираются в Python, а не подзапросом в SQL.
+    """
+    materials = Material.objects.order_by('pk')
+    if material_ids is not None:
+        materials = materials.filter(pk__in=material_ids)
+    
+    chunk = []
+    for row in materials.values_list('pk', 'title', 'content').iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield _with_questions(chunk)
+            chunk = []
+    if chunk:
+        yield _with_questions(chunk)
+
+
+def _with_questions(rows):
+    questions = {}
+    for material_id, text in Question.objects.filter(
+        test__material_id__in=[pk for pk, _, _ in rows]
+    ).order_by('test__material_id', 'order').values_list('test__material_id', 'text'):
+        questions.setdefault(material_id, []).append(text)
+    return [(pk, title, content, ' '.join(questions.get(pk, ()))) for pk, title, content in rows]
+
+
+class SearchBackend(ABC):
+    """Общая часть индексов: документы материалов собираются в Python"""
+    
+    @abstractmethod
+    def write_materials(self, documents):
+        """Записывает документы (id, название, содержание, вопросы) в индекс материалов"""
+    
+    @abstractmethod
+    def clear(self):
+        """Очищает индекс материалов и заполняет индексы разделов и вопросов заново"""
+    
+    def index_material(self, material_id):
+        for documents in material_documents([material_id]):
+            self.write_materials(documents)
+    
+    def index_test_material(self, test_id):
+        material_id = Test.objects.filter(pk=test_id).values_list('material_id', flat=True).first()
+        if material_id is not None:
+            self.index_material(material_id)
+    
+    def rebuild(self):
+        self.clear()
+        for documents in material_documents():
+            self.write_materials(documents)
+
+
+def _content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5: rowid строки индекса равен id материала, раздела или вопроса.
+    
+    Индекс материалов без содержимого (content=''): распакованный текст
+    материалов в базе не хранится. Такая строка удаляется командой 'delete'
+    с теми же значениями, что были проиндексированы, поэтому название и текст
+    вопросов документа хранятся в learning_material_fts_doc, а содержание
+    читается из материала, пока его хэш совпадает с проиндексированным
+    (документ удаляется до изменения материала, см. signals.py).
+    """
+    
+    SECTION_SOURCE = "SELECT s.id, s.title, coalesce(s.description, '') FROM learning_section s"
+    QUESTION_SOURCE = 'SELECT q.id, q.text FROM learning_question q'
+    
+    def _match(self, terms):
+        # Каждое слово - префиксный запрос в кавычках; слова объединяются через AND
+        return ' '.join(f'"{term}"*' for term in terms)
+    
+    def write_materials(self, documents):
+        indexed = self._indexed_materials([pk for pk, _, _, _ in documents])
+        changed = []
+        for pk, title, content, questions in documents:
+            row = (pk, title, questions, _content_hash(content))
+            current = indexed.get(pk)
+            if current is not None and current[:3] == row[1:]:
+                # Документ не изменился (например, у вопросов изменились только баллы)
+                del indexed[pk]
+                continue
+            changed.append((row, content))
+        if not changed:
+            return
+        stale = set(indexed) - self._delete_documents(indexed)
+        # Строку, которую не удалось удалить, исправляет rebuild_search_index
+        changed = [(row, content) for row, content in changed if row[0] not in stale]
+        if not changed:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO learning_material_fts (rowid, title, content, questions) '
+                'VALUES (%s, %s, %s, %s)',
+                [(pk, title, content, questions) for (pk, title, questions, _), content in changed]
+            )
+            cursor.executemany(
+                'INSERT OR REPLACE INTO learning_material_fts_doc '
+                '(material_id, title, questions, content_hash) VALUES (%s, %s, %s, %s)',
+                [row for row, _ in changed]
+            )
+    
+    def _indexed_materials(self, material_ids):
+        """Проиндексированные документы: id -> (название, вопросы, хэш, содержание в базе)"""
+        placeholders = ', '.join(['%s'] * len(material_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT d.material_id, d.title, d.questions, d.content_hash, m.content '
+                'FROM learning_material_fts_doc d '
+                'LEFT JOIN learning_material m ON m.id = d.material_id '
+                f'WHERE d.material_id IN ({placeholders})',
+                material_ids
+            )
+            return {material_id: rest for material_id, *rest in cursor.fetchall()}
+    
+    def _delete_documents(self, indexed):
+        """
+        Удаляет строки индекса по проиндексированным значениям.
+        
+        Возвращает id удалённых документов. Если содержание материала изменили
+        в обход ORM, проиндексированный текст восстановить нельзя: документ
+        остаётся в индексе до rebuild_search_index.
+        """
+        commands = []
+        for material_id, (title, questions, content_hash, stored) in indexed.items():
+            content = None if stored is None else decompress(stored)
+            if content is None or _content_hash(content) != content_hash:
+                logger.warning(
+                    'Поисковый документ материала %s не совпадает с базой, '
+                    'выполните rebuild_search_index',
+                    material_id
+                )
+                continue
+            commands.append(('delete', material_id, title, content, questions))
+        if commands:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    'INSERT INTO learning_material_fts '
+                    '(learning_material_fts, rowid, title, content, questions) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    commands
+                )
+        return {material_id for _, material_id, _, _, _ in commands}
+    
+    def remove_material(self, material_id):
+        indexed = self._indexed_materials([material_id])
+        if indexed and self._delete_documents(indexed):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM learning_material_fts_doc WHERE material_id = %s', [material_id]
+                )
+    
+    def index_section(self, section_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT OR REPLACE INTO learning_section_fts (rowid, title, description) '
+                + self.SECTION_SOURCE + ' WHERE s.id = %s',
+                [section_id]
+            )
+    
+    def remove_section(self, section_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM learning_section_fts WHERE rowid = %s', [section_id])
+    
+    def _index_questions(self, condition, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT OR REPLACE INTO learning_question_fts (rowid, text) '
+                + self.QUESTION_SOURCE + ' WHERE ' + condition,
+                params
+            )
+    
+    def index_question(self, question_id):
+        self._index_questions('q.id = %s', [question_id])
+    
+    def index_test_questions(self, test_id):
+        self._index_questions('q.test_id = %s', [test_id])
+    
+    def remove_questions(self, question_ids):
+        placeholders = ', '.join(['%s'] * len(question_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM learning_question_fts WHERE rowid IN ({placeholders})', question_ids
+            )
+    
+    def remove_test_questions(self, test_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM learning_question_fts WHERE rowid IN '
+                '(SELECT id FROM learning_question WHERE test_id = %s)',
+                [test_id]
+            )
+    
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO learning_material_fts (learning_material_fts) VALUES ('delete-all')"
+            )
+            cursor.execute('DELETE FROM learning_material_fts_doc')
+            cursor.execute('DELETE FROM learning_section_fts')
+            cursor.execute('DELETE FROM learning_question_fts')
+            cursor.execute(
+                'INSERT INTO learning_section_fts (rowid, title, description) ' + self.SECTION_SOURCE
+            )
+            cursor.execute('INSERT INTO learning_question_fts (rowid, text) ' + self.QUESTION_SOURCE)
+    
+    def ranked(self, table, weights, queryset, terms, limit, snippets=True):
+        """snippets=False - таблица без содержимого, фрагмент строится в Python"""
+        visible_sql, visible_params = _subquery(queryset)
+        if snippets:
+            snippet = f"snippet({table}, -1, %s, %s, '…', {SNIPPET_WORDS})"
+            params = [SNIPPET_START, SNIPPET_END]
+        else:
+            snippet, params = 'NULL', []
+        sql = (
+            f"SELECT rowid, bm25({table}, {', '.join(map(str, weights))}) AS rank, {snippet} "
+            f"FROM {table} WHERE {table} MATCH %s AND rowid IN ({visible_sql}) "
+            f"ORDER BY rank LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, self._match(terms), *visible_params, limit])
+            # bm25 возвращает отрицательные значения: чем меньше, тем релевантнее
+            return [(pk, -rank, snippet) for pk, rank, snippet in cursor.fetchall()]
+    
+    def search_materials(self, queryset, terms, limit):
+        return self.ranked(
+            'learning_material_fts', (10.0, 1.0, 2.0), queryset, terms, limit, snippets=False
+        )
+    
+    def search_sections(self, queryset, terms, limit):
+        return self.ranked('learning_section_fts', (10.0, 1.0), queryset, terms, limit)
+    
+    def filter(self, queryset, terms):
+        table = f'{queryset.model._meta.db_table}_fts'
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [self._match(terms)]
+        ))
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector: отдельные таблицы документов с GIN-индексом"""
+    
+    CONFIG = 'russian'
+    SECTION_DOCUMENT = """
+        SELECT s.id,
+            setweight(to_tsvector('russian', s.title), 'A')
+            || setweight(to_tsvector('russian', coalesce(s.description, '')), 'C')
+        FROM learning_section s
+    """
+    QUESTION_DOCUMENT = "SELECT q.id, to_tsvector('russian', q.text) FROM learning_question q"
+    
+    def _tsquery(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+    
+    def write_materials(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO learning_material_search (material_id, document) VALUES (%s, "
+                "setweight(to_tsvector('russian', %s), 'A') "
+                "|| setweight(to_tsvector('russian', %s), 'C') "
+                "|| setweight(to_tsvector('russian', %s), 'B')) "
+                "ON CONFLICT (material_id) DO UPDATE SET document = EXCLUDED.document",
+                documents
+            )
+    
+    def remove_material(self, material_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM learning_material_search WHERE material_id = %s', [material_id])
+    
+    def index_section(self, section_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO learning_section_search (section_id, document) '
+                + self.SECTION_DOCUMENT + ' WHERE s.id = %s '
+                'ON CONFLICT (section_id) DO UPDATE SET document = EXCLUDED.document',
+                [section_id]
+            )
+    
+    def remove_section(self, section_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM learning_section_search WHERE section_id = %s', [section_id])
+    
+    def _index_questions(self, condition, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO learning_question_search (question_id, document) '
+                + self.QUESTION_DOCUMENT + ' WHERE ' + condition + ' '
+                'ON CONFLICT (question_id) DO UPDATE SET document = EXCLUDED.document',
+                params
+            )
+    
+    def index_question(self, question_id):
+        self._index_questions('q.id = %s', [question_id])
+    
+    def index_test_questions(self, test_id):
+        self._index_questions('q.test_id = %s', [test_id])
+    
+    def remove_questions(self, question_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM learning_question_search WHERE question_id = ANY(%s)', [list(question_ids)]
+            )
+    
+    def remove_test_questions(self, test_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM learning_question_search WHERE question_id IN '
+                '(SELECT id FROM learning_question WHERE test_id = %s)',
+                [test_id]
+            )
+    
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'TRUNCATE learning_material_search, learning_section_search, learning_question_search'
+            )
+            cursor.execute(
+                'INSERT INTO learning_section_search (section_id, document) ' + self.SECTION_DOCUMENT
+            )
+            cursor.execute(
+                'INSERT INTO learning_question_search (question_id, document) ' + self.QUESTION_DOCUMENT
+            )
+    
+    def ranked(self, table, key, queryset, terms, limit, headline=None):
+        """headline - (таблица объектов, выражение текста) для ts_headline или None"""
+        visible_sql, visible_params = _subquery(queryset)
+        if headline is None:
+            snippet, join, params = 'NULL', '', []
+        else:
+            source, expression = headline
+            options = f'StartSel={SNIPPET_START},StopSel={SNIPPET_END},MaxWords={SNIPPET_WORDS},MinWords=5'
+            snippet = f"ts_headline('{self.CONFIG}', {expression}, query, %s)"
+            join = f'JOIN {source} o ON o.id = d.{key}'
+            params = [options]
+        sql = (
+            f"SELECT d.{key}, ts_rank_cd(d.document, query) AS rank, {snippet} "
+            f"FROM {table} d {join} CROSS JOIN to_tsquery('{self.CONFIG}', %s) query "
+            f"WHERE d.document @@ query AND d.{key} IN ({visible_sql}) "
+            f"ORDER BY rank DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, self._tsquery(terms), *visible_params, limit])
+            return cursor.fetchall()
+    
+    def search_materials(self, queryset, terms, limit):
+        # Содержание сжато, фрагмент строится в Python (см. search)
+        return self.ranked('learning_material_search', 'material_id', queryset, terms, limit)
+    
+    def search_sections(self, queryset, terms, limit):
+        return self.ranked(
+            'learning_section_search', 'section_id', queryset, terms, limit,
+            headline=('learning_section', "o.title || ' ' || coalesce(o.description, '')")
+        )
+    
+    def filter(self, queryset, terms):
+        table = f'{queryset.model._meta.db_table}_search'
+        key = f'{queryset.model._meta.model_name}_id'
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT {key} FROM {table} WHERE document @@ to_tsquery('{self.CONFIG}', %s)",
+            [self._tsquery(terms)]
+        ))
+
+
+class FallbackSearchBackend:
+    """
+    Поиск через icontains для СУБД без поддерживаемого индекса.
+    
+    Содержание материалов хранится сжатым, поэтому ищется только по его началу (excerpt).
+    """
+    
+    FIELDS = {
+        'material': ('title', 'excerpt'),
+        'section': ('title', 'description'),
+        'question': ('text',),
+    }
+    
+    def index_material(self, material_id):
+        pass
+    
+    def index_test_material(self, test_id):
+        pass
+    
+    def remove_material(self, material_id):
+        pass
+    
+    def index_section(self, section_id):
+        pass
+    
+    def remove_section(self, section_id):
+        pass
+    
+    def index_question(self, question_id):
+        pass
+    
+    def index_test_questions(self, test_id):
+        pass
+    
+    def remove_questions(self, question_ids):
+        pass
+    
+    def remove_test_questions(self, test_id):
+        pass
+    
+    def rebuild(self):
+        pass
+    
+    def filter(self, queryset, terms):
+        fields = self.FIELDS[queryset.model._meta.model_name]
+        for term in terms:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+    
+    def _ranked(self, queryset, terms, limit):
+        fields = self.FIELDS[queryset.model._meta.model_name]
+        results = []
+        for pk, *values in self.filter(queryset, terms).values_list('pk', *fields)[:limit]:
+            text = ' '.join(value or '' for value in values)
+            results.append((pk, 0.0, make_snippet(text, terms)))
+        return results
+    
+    def search_materials(self, queryset, terms, limit):
+        return self._ranked(queryset, terms, limit)
+    
+    def search_sections(self, queryset, terms, limit):
+        return self._ranked(queryset, terms, limit)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и заменяет служебные маркеры на <mark>"""
+    return str(escape(snippet or '')).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def make_snippet(text, terms):
+    """Фрагмент текста вокруг первого найденного слова с подсветкой"""
+    words = text.split()
+    lowered = [word.lower() for word in words]
+    start = next(
+        (i for i, word in enumerate(lowered) if any(term in word for term in terms)), 0
+    )
+    begin = max(0, start - SNIPPET_WORDS // 2)
+    fragment = []
+    for word, low in zip(words[begin:begin + SNIPPET_WORDS], lowered[begin:begin + SNIPPET_WORDS]):
+        if any(term in low for term in terms):
+            word = f'{SNIPPET_START}{word}{SNIPPET_END}'
+        fragment.append(word)
+    return ('…' if begin else '') + ' '.join(fragment)
+
+
+@lru_cache(maxsize=None)
+def _backend_for(vendor):
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def get_backend():
+    return _backend_for(connection.vendor)
+
+
+def filter_queryset(queryset, query):
+    """Ограничивает материалы, разделы или вопросы найденными по запросу (?q=, админка)"""
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_backend().filter(queryset, terms)
+
+
+def search(queryset, query, limit=20):
+    """
+    Ищет среди видимых объектов queryset (материалы или разделы).
+    
+    Возвращает объекты в порядке релевантности с атрибутами
+    search_rank и search_snippet.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return []
+    backend = get_backend()
+    if queryset.model._meta.model_name == 'material':
+        hits = backend.search_materials(queryset, terms, limit)
+    else:
+        hits = backend.search_sections(queryset, terms, limit)
+    
+    # Содержание распаковывается, только если фрагмент не построил сам движок
+    if queryset.model is Material and all(snippet is not None for _, _, snippet in hits):
+        queryset = queryset.defer('content')
+    objects = queryset.in_bulk([pk for pk, _, _ in hits])
+    results = []
+    for pk, rank, snippet in hits:
+        obj = objects.get(pk)
+        if obj is not None:
+            if snippet is None:
+                snippet = make_snippet(
+                    ' '.join(getattr(obj, field) or '' for field in TEXT_FIELDS[obj._meta.model_name]),
+                    terms
+                )
+            obj.search_rank = rank
+            obj.search_snippet = highlight(snippet)
+            results.append(obj)
+    return results
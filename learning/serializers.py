@@ -1,18 +1,64 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import (
     User, Section, Material, Test, Question, Answer,
-    TestResult, UserAnswer
+    TestResult, UserAnswer, TestStats
 )
 
 
+class SparseFieldsetMixin:
+    """
+    Поля ответа по параметру ?fields=id,title,... (только для чтения).
+    
+    Применяется к сериализатору верхнего уровня (и к элементам списка);
+    вложенные сериализаторы отдаются целиком, неизвестные имена полей игнорируются.
+    """
+    
+    def get_requested_fields(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get('fields')
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+    
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.get_requested_fields()
+        if requested is None or not self.is_root_serializer():
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
+
+
+def validate_new_password(attrs):
+    """
+    Проверяет пароль валидаторами Django.
+    
+    Валидаторы получают несохранённого пользователя, чтобы
+    UserAttributeSimilarityValidator сравнивал пароль с логином и email.
+    """
+    user = User(**{
+        key: value for key, value in attrs.items() if key not in ('password', 'password2')
+    })
+    try:
+        validate_password(attrs['password'], user=user)
+    except DjangoValidationError as exc:
+        raise serializers.ValidationError({"password": list(exc.messages)})
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Сериализатор для регистрации пользователя"""
-    password = serializers.CharField(
-        write_only=True,
-        required=True,
-        validators=[validate_password]
-    )
+    password = serializers.CharField(write_only=True, required=True)
     password2 = serializers.CharField(write_only=True, required=True)
     
     class Meta:
@@ -27,18 +73,41 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "Пароли не совпадают"})
+        validate_new_password(attrs)
         return attrs
     
     def create(self, validated_data):
         validated_data.pop('password2')
         password = validated_data.pop('password')
-        user = User.objects.create_user(**validated_data)
+        user = User(**validated_data)
+        # Нормализация логина и email, как в create_user
+        user.clean()
+        # Пароль хэшируется до save(), который ждёт очереди писателей SQLite
         user.set_password(password)
-        user.save()
+        user.save(force_insert=True)
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserImportSerializer(serializers.ModelSerializer):
+    """Сериализатор строки массового импорта пользователей"""
+    password = serializers.CharField(write_only=True, required=True)
+    
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'password', 'role', 'phone', 'first_name', 'last_name']
+        extra_kwargs = {
+            # Уникальность логинов проверяется одним запросом для всего файла
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'email': {'required': True},
+            'phone': {'required': False, 'allow_blank': True},
+        }
+    
+    def validate(self, attrs):
+        validate_new_password(attrs)
+        return attrs
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для пользователя"""
     class Meta:
         model = User
@@ -82,7 +151,61 @@ class QuestionDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TestSerializer(serializers.ModelSerializer):
+class AnswerWriteSerializer(serializers.ModelSerializer):
+    """Сериализатор варианта ответа для массового сохранения вопросов"""
+    class Meta:
+        model = Answer
+        fields = ['text', 'is_correct', 'order']
+        extra_kwargs = {
+            'is_correct': {'required': False, 'default': False},
+            'order': {'required': True},
+        }
+
+
+class QuestionWriteSerializer(serializers.ModelSerializer):
+    """Сериализатор вопроса с вложенными ответами для массового сохранения"""
+    answers = AnswerWriteSerializer(many=True, allow_empty=False)
+    
+    class Meta:
+        model = Question
+        fields = ['text', 'question_type', 'points', 'order', 'answers']
+        extra_kwargs = {
+            'question_type': {'required': False, 'default': 'single'},
+            'points': {'required': False, 'default': 1},
+            'order': {'required': True},
+        }
+    
+    def validate(self, attrs):
+        answers = attrs['answers']
+        orders = [answer['order'] for answer in answers]
+        if len(set(orders)) != len(orders):
+            raise serializers.ValidationError({"answers": "Порядковые номера ответов повторяются"})
+        
+        correct = sum(1 for answer in answers if answer['is_correct'])
+        if attrs['question_type'] == 'single' and correct != 1:
+            raise serializers.ValidationError(
+                {"answers": "У вопроса с одним ответом должен быть ровно один правильный вариант"}
+            )
+        if correct == 0:
+            raise serializers.ValidationError({"answers": "Нужен хотя бы один правильный вариант"})
+        return attrs
+
+
+class TestQuestionsBulkSerializer(serializers.Serializer):
+    """Сериализатор для массового сохранения вопросов теста"""
+    MODES = ['upsert', 'replace']
+    
+    mode = serializers.ChoiceField(choices=MODES, default='upsert')
+    questions = QuestionWriteSerializer(many=True, allow_empty=False)
+    
+    def validate_questions(self, value):
+        orders = [question['order'] for question in value]
+        if len(set(orders)) != len(orders):
+            raise serializers.ValidationError("Порядковые номера вопросов повторяются")
+        return value
+
+
+class TestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для теста"""
     questions_count = serializers.SerializerMethodField()
     
@@ -92,10 +215,14 @@ class TestSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_questions_count(self, obj):
-        return obj.questions.count()
+        # Списки аннотируют questions_count в TestViewSet.get_queryset
+        count = getattr(obj, 'questions_count', None)
+        if count is None:
+            count = obj.questions.count()
+        return count
 
 
-class TestDetailSerializer(serializers.ModelSerializer):
+class TestDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для детального просмотра теста"""
     questions = QuestionSerializer(many=True, read_only=True)
     
@@ -105,7 +232,7 @@ class TestDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class TestDetailForOwnerSerializer(serializers.ModelSerializer):
+class TestDetailForOwnerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для детального просмотра теста владельцем (с правильными ответами)"""
     questions = QuestionDetailSerializer(many=True, read_only=True)
     
@@ -115,30 +242,64 @@ class TestDetailForOwnerSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для материала"""
     has_test = serializers.SerializerMethodField()
     
     class Meta:
         model = Material
-        fields = ['id', 'title', 'content', 'section', 'order', 'is_published', 'has_test', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = [
+            'id', 'title', 'content', 'section', 'order', 'is_published', 'has_test',
+            'content_length', 'content_hash', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'content_length', 'content_hash', 'created_at', 'updated_at']
+    
+    def get_has_test(self, obj):
+        # Списки аннотируют has_test через Material.objects.with_test_flag()
+        has_test = getattr(obj, 'has_test', None)
+        if has_test is None:
+            has_test = hasattr(obj, 'test')
+        return has_test
+
+
+class MaterialListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Материал в списках: вместо content - размер, хэш и начало текста.
+    
+    Списки загружают материалы с defer('content'); полный текст отдаёт
+    MaterialDetailSerializer или эндпоинт /api/materials/{id}/content/.
+    """
+    has_test = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Material
+        fields = [
+            'id', 'title', 'section', 'order', 'is_published', 'has_test',
+            'content_length', 'content_hash', 'excerpt', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
     
     def get_has_test(self, obj):
-        return hasattr(obj, 'test')
+        has_test = getattr(obj, 'has_test', None)
+        if has_test is None:
+            has_test = hasattr(obj, 'test')
+        return has_test
 
 
-class MaterialDetailSerializer(serializers.ModelSerializer):
+class MaterialDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для детального просмотра материала"""
     test = TestSerializer(read_only=True)
     
     class Meta:
         model = Material
-        fields = ['id', 'title', 'content', 'section', 'order', 'is_published', 'test', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = [
+            'id', 'title', 'content', 'section', 'order', 'is_published', 'test',
+            'content_length', 'content_hash', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'content_length', 'content_hash', 'created_at', 'updated_at']
 
 
-class SectionSerializer(serializers.ModelSerializer):
+class SectionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для раздела"""
     materials_count = serializers.SerializerMethodField()
     owner_username = serializers.CharField(source='owner.username', read_only=True)
@@ -149,12 +310,16 @@ class SectionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_materials_count(self, obj):
-        return obj.materials.count()
+        # Списки аннотируют materials_count в SectionViewSet.get_queryset
+        count = getattr(obj, 'materials_count', None)
+        if count is None:
+            count = obj.materials.count()
+        return count
 
 
-class SectionDetailSerializer(serializers.ModelSerializer):
+class SectionDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для детального просмотра раздела"""
-    materials = MaterialSerializer(many=True, read_only=True)
+    materials = MaterialListSerializer(many=True, read_only=True)
     owner_username = serializers.CharField(source='owner.username', read_only=True)
     
     class Meta:
@@ -163,6 +328,26 @@ class SectionDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class MaterialSearchResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Найденный материал: релевантность и фрагмент текста с подсветкой"""
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    snippet = serializers.CharField(source='search_snippet', read_only=True)
+    
+    class Meta:
+        model = Material
+        fields = ['id', 'title', 'section', 'rank', 'snippet']
+
+
+class SectionSearchResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Найденный раздел: релевантность и фрагмент текста с подсветкой"""
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    snippet = serializers.CharField(source='search_snippet', read_only=True)
+    
+    class Meta:
+        model = Section
+        fields = ['id', 'title', 'rank', 'snippet']
+
+
 class UserAnswerSubmitSerializer(serializers.Serializer):
     """Сериализатор для отправки ответов на тест"""
     question_id = serializers.IntegerField()
@@ -191,7 +376,7 @@ class UserAnswerSerializer(serializers.ModelSerializer):
         return [answer.text for answer in obj.selected_answers.all()]
 
 
-class TestResultSerializer(serializers.ModelSerializer):
+class TestResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для результата теста"""
     test_title = serializers.CharField(source='test.title', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
@@ -201,3 +386,18 @@ class TestResultSerializer(serializers.ModelSerializer):
         model = TestResult
         fields = ['id', 'test', 'test_title', 'user', 'user_username', 'score', 'is_passed', 'user_answers', 'completed_at']
         read_only_fields = ['id', 'score', 'is_passed', 'completed_at']
+
+
+class TestStatsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Сериализатор для статистики теста"""
+    pass_rate = serializers.FloatField(read_only=True)
+    mean_score = serializers.FloatField(read_only=True)
+    median_score = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TestStats
+        fields = ['test', 'attempts', 'passed', 'pass_rate', 'mean_score', 'median_score', 'score_histogram', 'updated_at']
+        read_only_fields = fields
+    
+    def get_median_score(self, obj):
+        return obj.percentile(50)
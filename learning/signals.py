@@ -0,0 +1,212 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import mark_user_changed
+from .models import User, Section, Material, Test, Question, Answer, TestResult, TestStats
+from .search import get_backend as get_search_backend
+from .sqlite import configure_connection
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_test_touch(test_id):
+    """
+    Отключает обновление теста и поисковых индексов из сигналов Question/Answer
+    внутри блока и выполняет их один раз в конце (для массовых изменений):
+    число запросов не зависит от числа изменённых и удалённых вопросов.
+    """
+    _deferred.active = True
+    _deferred.removed_questions = []
+    try:
+        yield
+    finally:
+        _deferred.active = False
+    _touch_test(test_id)
+    backend = get_search_backend()
+    if _deferred.removed_questions:
+        backend.remove_questions(_deferred.removed_questions)
+    backend.index_test_material(test_id)
+    backend.index_test_questions(test_id)
+
+
+def _touch_deferred():
+    return getattr(_deferred, 'active', False)
+
+
+def _touch_test(test_id):
+    """
+    Отмечает тест изменённым: его вопросы и ответы входят в содержимое теста,
+    а updated_at служит версией кэшированных данных теста (см. cache.py)
+    """
+    Test.objects.filter(pk=test_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Material)
+def index_material_on_save(sender, instance, **kwargs):
+    """Обновляет поисковый документ материала"""
+    get_search_backend().index_material(instance.pk)
+
+
+@receiver(pre_save, sender=Material)
+def unindex_material_before_save(sender, instance, **kwargs):
+    """
+    Снимает документ материала из индекса, пока в базе прежнее содержание:
+    индекс без содержимого удаляет строку по проиндексированному тексту
+    """
+    if not instance._state.adding:
+        get_search_backend().remove_material(instance.pk)
+
+
+@receiver(pre_delete, sender=Material)
+def unindex_material_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove_material(instance.pk)
+
+
+@receiver(post_save, sender=Section)
+def index_section_on_save(sender, instance, **kwargs):
+    """Обновляет поисковый документ раздела"""
+    get_search_backend().index_section(instance.pk)
+
+
+@receiver(post_delete, sender=Section)
+def unindex_section_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove_section(instance.pk)
+
+
+def _cascaded(origin, model):
+    """Удаление пришло каскадом от объекта другой модели (origin - начало удаления)"""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return not issubclass(origin_model, model)
+
+
+def _first_in_operation(origin, key):
+    """
+    Выполнялось ли действие key в этом удалении впервые.
+    
+    Удаление queryset отправляет сигнал на каждую строку с одним и тем же
+    origin, поэтому тест обновляется один раз на удаление, а не на строку.
+    """
+    if not isinstance(origin, QuerySet):
+        return True
+    done = origin.__dict__.setdefault('_signal_actions', set())
+    if key in done:
+        return False
+    done.add(key)
+    return True
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_test_on_question_change(sender, instance, origin=None, **kwargs):
+    """
+    Сбрасывает кэшированные данные теста при изменении вопроса.
+    
+    При каскадном удалении тест удаляется вместе с вопросами, документ
+    материала обновляется один раз после удаления теста.
+    """
+    if _touch_deferred() or _cascaded(origin, Question):
+        return
+    if not _first_in_operation(origin, ('test', instance.test_id)):
+        return
+    _touch_test(instance.test_id)
+    # Текст вопросов входит в поисковый документ материала
+    get_search_backend().index_test_material(instance.test_id)
+
+
+@receiver(post_save, sender=Question)
+def index_question_on_save(sender, instance, **kwargs):
+    """Обновляет поисковый документ вопроса (массовые изменения - в defer_test_touch)"""
+    if _touch_deferred():
+        return
+    get_search_backend().index_question(instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def unindex_question_on_delete(sender, instance, origin=None, **kwargs):
+    # Вопросы удаляемого теста и удалённые в defer_test_touch снимаются
+    # из индекса одним запросом
+    if _touch_deferred():
+        _deferred.removed_questions.append(instance.pk)
+    elif not _cascaded(origin, Question):
+        get_search_backend().remove_questions([instance.pk])
+
+
+@receiver(pre_delete, sender=Test)
+def unindex_test_questions_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove_test_questions(instance.pk)
+
+
+@receiver(post_delete, sender=Test)
+def reindex_material_on_test_delete(sender, instance, origin=None, **kwargs):
+    """Текст вопросов удалённого теста убирается из документа материала"""
+    if not _cascaded(origin, Test):
+        get_search_backend().index_material(instance.material_id)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_test_on_answer_change(sender, instance, origin=None, **kwargs):
+    """
+    Сбрасывает кэшированные данные теста при изменении варианта ответа.
+    
+    Каскадное удаление (от вопроса, теста, материала) обрабатывают сигналы
+    удаляемого объекта.
+    """
+    if _touch_deferred() or _cascaded(origin, Answer):
+        return
+    if not _first_in_operation(origin, ('question', instance.question_id)):
+        return
+    test_id = Question.objects.filter(
+        pk=instance.question_id
+    ).values_list('test_id', flat=True).first()
+    if test_id is not None and _first_in_operation(origin, ('test', test_id)):
+        _touch_test(test_id)
+
+
+@receiver(pre_delete, sender=User)
+def collect_result_tests_on_user_delete(sender, instance, **kwargs):
+    """
+    Запоминает тесты, результаты пользователя по которым удалит каскад.
+    
+    Обработчиков удаления TestResult нет, поэтому каскад удаляет результаты
+    одним запросом, а статистика пересчитывается после удаления пользователя.
+    Статистика удалённых тестов удаляется вместе с ними.
+    """
+    instance._result_test_ids = list(
+        TestResult.objects.filter(user=instance).values_list('test_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_claims_on_user_change(sender, instance, created, **kwargs):
+    """
+    Любое сохранение пользователя сбрасывает его строки в LRU процессов,
+    а выпущенные ранее токены перестают приниматься по claims.
+    """
+    if not created:
+        mark_user_changed(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_claims_on_user_delete(sender, instance, **kwargs):
+    """Токены удалённого пользователя перестают приниматься по claims"""
+    mark_user_changed(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def rebuild_stats_on_user_delete(sender, instance, **kwargs):
+    TestStats.rebuild(getattr(instance, '_result_test_ids', ()))
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """PRAGMA профиля SQLite (WAL, synchronous, busy_timeout, mmap, кэш)"""
+    configure_connection(connection)
@@ -0,0 +1,77 @@
+"""
+Профиль SQLite для production.
+
+При подключении включаются WAL, synchronous=NORMAL, busy_timeout, mmap и
+кэш страниц (settings.SQLITE_PRAGMAS). SQLite допускает одного писателя,
+а транзакции Django начинаются с отложенного BEGIN, поэтому параллельные
+записи получают "database is locked" при повышении блокировки. run_serialized
+выстраивает писателей процесса в очередь, начинает их транзакции с
+BEGIN IMMEDIATE и повторяет транзакцию с экспоненциальной задержкой, если
+базу держит другой процесс.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+# Очередь писателей процесса: блокировка отдаётся потокам по одному; повторный
+# вход того же потока (запись из save() внутри run_serialized) не блокирует его
+_write_lock = threading.RLock()
+
+
+def configure_connection(connection):
+    """Применяет PRAGMA из settings.SQLITE_PRAGMAS к новому соединению SQLite"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def _begin_immediate(execute, sql, params, many, context):
+    """
+    Начинает транзакции с BEGIN IMMEDIATE: блокировка записи берётся сразу
+    (с ожиданием busy_timeout), а не при первой записи после чтений, когда
+    другой процесс мог уже изменить базу и SQLite отказывает без ожидания.
+    """
+    if sql == 'BEGIN':
+        sql = 'BEGIN IMMEDIATE'
+    return execute(sql, params, many, context)
+
+
+def run_serialized(func, using=DEFAULT_DB_ALIAS):
+    """
+    Выполняет func (транзакцию записи) по очереди с другими писателями процесса.
+    
+    Транзакции func начинаются с BEGIN IMMEDIATE. При блокировке базы
+    другим процессом транзакция повторяется до
+    SQLITE_WRITE_RETRIES раз с экспоненциальной задержкой и случайным разбросом.
+    Внутри внешней транзакции повтор невозможен, поэтому func вызывается как есть;
+    для других СУБД тоже.
+    """
+    connection = connections[using]
+    if (
+        connection.vendor != 'sqlite'
+        or not getattr(settings, 'SQLITE_SERIALIZE_WRITES', False)
+        or connection.in_atomic_block
+    ):
+        return func()
+    
+    retries = settings.SQLITE_WRITE_RETRIES
+    delay = settings.SQLITE_WRITE_RETRY_DELAY
+    with _write_lock, connection.execute_wrapper(_begin_immediate):
+        for attempt in range(retries + 1):
+            try:
+                return func()
+            except OperationalError as exc:
+                if attempt == retries or not is_locked_error(exc):
+                    raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
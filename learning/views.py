@@ -1,28 +1,85 @@
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Q
+from django.db.models import (
+    Count, Max, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+)
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
-from .models import (
-    User, Section, Material, Test, Question, Answer,
-    TestResult, UserAnswer
-)
+from .models import User, Section, Material, Test, TestResult, UserAnswer, TestStats
 from .serializers import (
-    UserRegistrationSerializer, UserSerializer,
+    UserRegistrationSerializer, UserSerializer, UserImportSerializer,
     SectionSerializer, SectionDetailSerializer,
-    MaterialSerializer, MaterialDetailSerializer,
+    MaterialSerializer, MaterialListSerializer, MaterialDetailSerializer,
     TestSerializer, TestDetailSerializer, TestDetailForOwnerSerializer,
-    TestSubmissionSerializer, TestResultSerializer
+    TestSubmissionSerializer, TestResultSerializer, TestStatsSerializer,
+    TestQuestionsBulkSerializer, MaterialSearchResultSerializer, SectionSearchResultSerializer
 )
 from .permissions import (
     IsAdminOrReadOnly, IsOwnerOrReadOnly,
     IsTeacherOrReadOnly, IsStudentOrOwner
 )
+from .grading import GradingError, submit_test
+from .authoring import save_questions
+from .provisioning import ProvisioningError, create_users, read_user_rows, split_valid_rows
+from .analytics import item_analysis
+from .export import EXPORT_FORMATS, iter_result_rows
+from .cache import get_content_gzip, get_test_payload, set_content_gzip, set_test_payload
+from .middleware import accepts_gzip, encoded_response
+from .mixins import ConditionalRequestMixin
+from .ownership import is_owner
+from .authentication import ClaimsRefreshToken, resolve_user
+from .pagination import SelectablePagination
+from .search import filter_queryset as search_filter_queryset, parse_terms, search
+from .ranges import RangeNotSatisfiable, parse_range
+from .renderers import PlainTextRenderer
+from .routers import use_primary
+
+
+def user_answers_prefetch():
+    """Загрузка ответов пользователя вместе с вопросами и выбранными вариантами"""
+    return Prefetch(
+        'user_answers',
+        queryset=UserAnswer.objects.select_related('question').prefetch_related('selected_answers')
+    )
+
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+
+def filter_by_search_query(view, queryset):
+    """Ограничивает список найденными по ?q= объектами (порядок списка не меняется)"""
+    query = view.request.query_params.get('q')
+    # Действие search само ранжирует видимые объекты по запросу
+    if query is None or view.action == 'search':
+        return queryset
+    return search_filter_queryset(queryset, query)
+
+
+def search_response(request, queryset, serializer_class):
+    """Ответ поиска: до ?limit= объектов по убыванию релевантности"""
+    query = request.query_params.get('q', '')
+    if not parse_terms(query):
+        return Response(
+            {'error': 'Укажите поисковый запрос в параметре q'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        limit = SEARCH_DEFAULT_LIMIT
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    
+    results = search(queryset, query, limit=limit)
+    return Response(serializer_class(results, many=True, context={'request': request}).data)
 
 
 def api_root(request):
@@ -35,6 +92,9 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = SelectablePagination
+    # Совпадает с индексом learning_user_created_idx
+    cursor_ordering = ('-created_at', '-id')
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def register(self, request):
@@ -42,7 +102,7 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'user': UserSerializer(user).data,
                 'refresh': str(refresh),
@@ -50,14 +110,34 @@ class UserViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Массовое создание пользователей администратором.
+        
+        Принимает CSV-файл в поле file или JSON {"users": [...]}.
+        Корректные строки создаются, ошибки возвращаются по номерам строк.
+        """
+        try:
+            rows = read_user_rows(request.data, request.FILES.get('file'))
+            valid, errors = split_valid_rows(rows, UserImportSerializer)
+            users = create_users([attrs for _, attrs in valid]) if valid else []
+        except ProvisioningError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'created': len(users),
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if users else status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
         """Получение информации о текущем пользователе"""
-        serializer = self.get_serializer(request.user)
+        serializer = self.get_serializer(resolve_user(request.user))
         return Response(serializer.data)
 
 
-class SectionViewSet(viewsets.ModelViewSet):
+class SectionViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     """ViewSet для управления разделами"""
     queryset = Section.objects.all()
     permission_classes = [IsOwnerOrReadOnly]
@@ -67,22 +147,73 @@ class SectionViewSet(viewsets.ModelViewSet):
             return SectionDetailSerializer
         return SectionSerializer
     
-    def get_queryset(self):
+    def get_visible_queryset(self):
         user = self.request.user
+        queryset = filter_by_search_query(self, Section.objects.all())
         if user.is_admin:
-            return Section.objects.all()
+            return queryset
         elif user.is_teacher:
             # Преподаватели видят свои разделы и опубликованные
-            return Section.objects.filter(Q(owner=user) | Q(is_published=True))
+            return queryset.filter(Q(owner=user.pk) | Q(is_published=True))
         else:
             # Студенты видят только опубликованные разделы
-            return Section.objects.filter(is_published=True)
+            return queryset.filter(is_published=True)
+    
+    def get_queryset(self):
+        # Агрегаты с GROUP BY не используют Meta.ordering, задаём порядок явно
+        queryset = self.get_visible_queryset().select_related('owner').annotate(
+            materials_count=Count('materials')
+        ).order_by(*Section._meta.ordering)
+        if self.action == 'retrieve':
+            # Время создания теста входит в валидаторы: от него зависит has_test
+            materials = Material.objects.with_test_flag().annotate(
+                test_created_at=Subquery(
+                    Test.objects.filter(material=OuterRef('pk')).values('created_at')[:1]
+                )
+            ).defer('content')
+            queryset = queryset.prefetch_related(Prefetch('materials', queryset=materials))
+        return queryset
+    
+    def get_validator_queryset(self):
+        return self.get_visible_queryset()
+    
+    def get_list_validator_aggregates(self):
+        # materials_count меняется вместе с материалами раздела
+        aggregates = super().get_list_validator_aggregates()
+        aggregates.update(
+            materials_last_modified=Max('materials__updated_at'),
+            materials_total=Count('materials', distinct=True),
+        )
+        return aggregates
+    
+    def get_object_validators(self, obj):
+        validators = super().get_object_validators(obj)
+        # Материалы уже предвыбраны в get_queryset
+        materials = obj.materials.all()
+        validators['materials_last_modified'] = max(
+            (material.updated_at for material in materials), default=None
+        )
+        validators['materials_total'] = len(materials)
+        # Создание или удаление теста меняет has_test материала
+        validators['materials_with_test'] = tuple(
+            material.pk for material in materials if material.has_test
+        )
+        validators['tests_last_created'] = max(
+            (material.test_created_at for material in materials if material.test_created_at),
+            default=None
+        )
+        return validators
     
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner=resolve_user(self.request.user))
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Разделы по релевантности запросу ?q= с фрагментами текста"""
+        return search_response(request, self.get_visible_queryset(), SectionSearchResultSerializer)
 
 
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     """ViewSet для управления материалами"""
     queryset = Material.objects.all()
     permission_classes = [IsOwnerOrReadOnly]
@@ -90,12 +221,14 @@ class MaterialViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return MaterialDetailSerializer
+        if self.action == 'list':
+            return MaterialListSerializer
         return MaterialSerializer
     
-    def get_queryset(self):
+    def get_visible_queryset(self):
         user = self.request.user
         section_id = self.request.query_params.get('section', None)
-        queryset = Material.objects.all()
+        queryset = filter_by_search_query(self, Material.objects.all())
         
         if section_id:
             queryset = queryset.filter(section_id=section_id)
@@ -105,21 +238,118 @@ class MaterialViewSet(viewsets.ModelViewSet):
         elif user.is_teacher:
             # Преподаватели видят свои материалы и опубликованные
             return queryset.filter(
-                Q(section__owner=user) | Q(is_published=True)
+                Q(section_owner=user.pk) | Q(is_published=True)
             )
         else:
             # Студенты видят только опубликованные материалы
             return queryset.filter(is_published=True)
     
+    def get_queryset(self):
+        if self.action == 'content':
+            # Содержание загружается, только если его нет в кэше (см. content_response)
+            return self.get_visible_queryset().defer('content')
+        queryset = self.get_visible_queryset().with_test_flag()
+        if self.action == 'list':
+            # Списки отдают размер, хэш и начало текста вместо content
+            queryset = queryset.defer('content')
+        elif self.action == 'retrieve':
+            queryset = queryset.select_related('test')
+            fields = self.request.query_params.get('fields')
+            if fields and 'content' not in fields.split(','):
+                queryset = queryset.defer('content')
+        return queryset
+    
+    def get_validator_queryset(self):
+        return self.get_visible_queryset()
+    
+    def get_list_validator_aggregates(self):
+        # has_test меняется при создании и удалении теста материала
+        aggregates = super().get_list_validator_aggregates()
+        aggregates.update(
+            tests_last_modified=Max('test__updated_at'),
+            tests_total=Count('test'),
+        )
+        return aggregates
+    
+    def get_object_validators(self, obj):
+        validators = super().get_object_validators(obj)
+        test = getattr(obj, 'test', None)
+        validators['test_last_modified'] = test.updated_at if test else None
+        return validators
+    
     def perform_create(self, serializer):
         section = serializer.validated_data['section']
         # Проверяем, что пользователь является владельцем раздела
-        if section.owner != self.request.user and not self.request.user.is_admin:
+        if not is_owner(self.request.user, section):
             raise PermissionDenied("Вы не являетесь владельцем этого раздела")
         serializer.save()
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Материалы по релевантности запросу ?q= с фрагментами текста.
+        
+        Ищется по названию, содержимому и вопросам теста материала;
+        учитываются те же права видимости и фильтр ?section=, что и в списке.
+        """
+        return search_response(request, self.get_visible_queryset(), MaterialSearchResultSerializer)
+    
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PlainTextRenderer])
+    def content(self, request, pk=None):
+        """
+        Содержание материала как text/plain с поддержкой Range.
+        
+        Размер и диапазоны считаются в байтах UTF-8 (content_length в списках),
+        ETag - хэш содержания, поэтому клиент может дочитывать текст частями
+        и возобновлять загрузку с If-Range.
+        """
+        material = self.get_object()
+        etag = f'"{material.content_hash}"'
+        last_modified = int(material.updated_at.timestamp())
+        
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.content_response(request, material, etag)
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        
+        response['Accept-Ranges'] = 'bytes'
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    def content_response(self, request, material, etag):
+        """Всё содержание (200), запрошенный диапазон (206) или 416"""
+        content_type = 'text/plain; charset=utf-8'
+        range_header = request.headers.get('Range')
+        # If-Range с устаревшим ETag: диапазон игнорируется, отдаётся всё содержание
+        if request.headers.get('If-Range', etag) != etag:
+            range_header = None
+        
+        if range_header is None and accepts_gzip(request):
+            # Сжатое содержание кэшируется по хэшу и не пересжимается
+            gzipped = get_content_gzip(material.content_hash)
+            if gzipped is None:
+                gzipped = set_content_gzip(material.content_hash, material.content.encode('utf-8'))
+            return encoded_response(request, None, gzipped, content_type, etag)
+        
+        body = material.content.encode('utf-8')
+        try:
+            byte_range = parse_range(range_header, len(body))
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{len(body)}'
+            return response
+        
+        if byte_range is None:
+            return HttpResponse(body, content_type=content_type)
+        start, end = byte_range
+        response = HttpResponse(body[start:end + 1], content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+        return response
 
 
-class TestViewSet(viewsets.ModelViewSet):
+class TestViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     """ViewSet для управления тестами"""
     queryset = Test.objects.all()
     permission_classes = [IsOwnerOrReadOnly]
@@ -129,13 +359,53 @@ class TestViewSet(viewsets.ModelViewSet):
             user = self.request.user
             test = self.get_object()
             # Если пользователь владелец материала, показываем правильные ответы
-            if hasattr(test, 'material') and hasattr(test.material, 'section'):
-                if test.material.section.owner == user or user.is_admin:
-                    return TestDetailForOwnerSerializer
+            if is_owner(user, test):
+                return TestDetailForOwnerSerializer
             return TestDetailSerializer
         return TestSerializer
     
-    def get_queryset(self):
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Детальный просмотр теста.
+        
+        JSON теста одинаков для всех студентов (и для всех владельцев), поэтому
+        он рендерится и сжимается gzip один раз на версию теста и отдаётся из
+        кэша с ETag и Last-Modified; при совпадении валидаторов возвращается 304.
+        """
+        test = self.get_object()
+        serializer_class = self.get_serializer_class()
+        # Кэшируется только полный JSON; выборка полей (?fields=) рендерится заново
+        if request.accepted_renderer.format != 'json' or 'fields' in request.query_params:
+            prefetch_related_objects([test], 'questions__answers')
+            return super().retrieve(request, *args, **kwargs)
+        
+        variant = 'owner' if serializer_class is TestDetailForOwnerSerializer else 'student'
+        payload = get_test_payload(test, variant)
+        if payload is None:
+            # Вопросы читаются из основной базы, чтобы в кэш под версией теста
+            # не попали данные отстающей реплики
+            with use_primary():
+                prefetch_related_objects([test], 'questions__answers')
+            serializer = serializer_class(test, context=self.get_serializer_context())
+            payload = set_test_payload(test, variant, JSONRenderer().render(serializer.data))
+        
+        response = get_conditional_response(
+            request,
+            etag=payload['etag'],
+            last_modified=payload['last_modified'],
+        )
+        if response is None:
+            # Сжатый вариант хранится в кэше вместе с JSON и не пересжимается
+            response = encoded_response(
+                request, payload['content'], payload.get('gzip'), 'application/json', payload['etag']
+            )
+        else:
+            response['ETag'] = payload['etag']
+        response['Last-Modified'] = http_date(payload['last_modified'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    def get_visible_queryset(self):
         user = self.request.user
         material_id = self.request.query_params.get('material', None)
         queryset = Test.objects.all()
@@ -148,16 +418,30 @@ class TestViewSet(viewsets.ModelViewSet):
         elif user.is_teacher:
             # Преподаватели видят свои тесты и тесты опубликованных материалов
             return queryset.filter(
-                Q(material__section__owner=user) | Q(material__is_published=True)
+                Q(section_owner=user.pk) | Q(effective_published=True)
             )
         else:
             # Студенты видят только тесты опубликованных материалов
-            return queryset.filter(material__is_published=True)
+            return queryset.filter(effective_published=True)
+    
+    def get_queryset(self):
+        queryset = self.get_visible_queryset()
+        if self.action in ('retrieve', 'submit', 'stats', 'item_analysis', 'bulk_questions'):
+            # Владелец и публикация хранятся в самом тесте, материал не загружается
+            return queryset
+        # Изменения вопросов обновляют Test.updated_at (см. signals),
+        # поэтому questions_count покрыт валидаторами списка
+        return queryset.annotate(
+            questions_count=Count('questions')
+        ).order_by(*Test._meta.ordering)
+    
+    def get_validator_queryset(self):
+        return self.get_visible_queryset()
     
     def perform_create(self, serializer):
         material = serializer.validated_data['material']
         # Проверяем, что пользователь является владельцем материала
-        if material.section.owner != self.request.user and not self.request.user.is_admin:
+        if not is_owner(self.request.user, material):
             raise PermissionDenied("Вы не являетесь владельцем этого материала")
         serializer.save()
     
@@ -168,96 +452,72 @@ class TestViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Проверяем, что материал опубликован
-        if not test.material.is_published:
+        if not test.effective_published:
             return Response(
                 {'error': 'Материал не опубликован'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Проверяем, не проходил ли пользователь тест ранее
-        test_result, created = TestResult.objects.get_or_create(
-            test=test,
-            user=user,
-            defaults={'score': 0, 'is_passed': False}
-        )
-        
-        if not created:
-            return Response(
-                {'error': 'Вы уже проходили этот тест'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         serializer = TestSubmissionSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        answers_data = serializer.validated_data['answers']
-        total_points = 0
-        max_points = 0
-        
-        # Обрабатываем каждый ответ
-        for answer_data in answers_data:
-            question_id = answer_data['question_id']
-            selected_answer_ids = answer_data['answer_ids']
-            
-            try:
-                question = Question.objects.get(id=question_id, test=test)
-            except Question.DoesNotExist:
-                return Response(
-                    {'error': f'Вопрос с id {question_id} не найден'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            max_points += question.points
-            
-            # Получаем выбранные ответы
-            selected_answers = Answer.objects.filter(
-                id__in=selected_answer_ids,
-                question=question
-            )
-            
-            if selected_answers.count() != len(selected_answer_ids):
-                return Response(
-                    {'error': f'Некоторые ответы для вопроса {question_id} не найдены'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Создаем запись ответа пользователя
-            user_answer = UserAnswer.objects.create(
-                test_result=test_result,
-                question=question
+        try:
+            test_result = submit_test(test, user, serializer.validated_data['answers'])
+        except GradingError as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            user_answer.selected_answers.set(selected_answers)
-            
-            # Проверяем правильность ответа
-            correct_answers = Answer.objects.filter(question=question, is_correct=True)
-            correct_answer_ids = set(correct_answers.values_list('id', flat=True))
-            selected_answer_ids_set = set(selected_answer_ids)
-            
-            if question.question_type == 'single':
-                # Для одного ответа - должен быть выбран ровно один правильный
-                if len(selected_answer_ids_set) == 1 and selected_answer_ids_set == correct_answer_ids:
-                    total_points += question.points
-            else:
-                # Для нескольких ответов - все правильные должны быть выбраны и никаких лишних
-                if selected_answer_ids_set == correct_answer_ids:
-                    total_points += question.points
-        
-        # Вычисляем процент правильных ответов
-        if max_points > 0:
-            score = int((total_points / max_points) * 100)
-        else:
-            score = 0
-        
-        # Обновляем результат теста
-        test_result.score = score
-        test_result.is_passed = score >= test.passing_score
-        test_result.save()
         
+        prefetch_related_objects([test_result], user_answers_prefetch())
         return Response(
             TestResultSerializer(test_result).data,
             status=status.HTTP_201_CREATED
         )
+    
+    @action(detail=True, methods=['post'], url_path='questions')
+    def bulk_questions(self, request, pk=None):
+        """
+        Массовое сохранение вопросов теста с ответами (для владельца).
+        
+        mode=upsert обновляет вопросы с совпадающим order и добавляет новые,
+        mode=replace дополнительно удаляет вопросы, которых нет в запросе.
+        """
+        test = self.get_owned_test()
+        serializer = TestQuestionsBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        summary = save_questions(
+            test,
+            serializer.validated_data['questions'],
+            replace=serializer.validated_data['mode'] == 'replace'
+        )
+        prefetch_related_objects([test], 'questions__answers')
+        return Response({
+            **summary,
+            'test': TestDetailForOwnerSerializer(test).data,
+        })
+    
+    def get_owned_test(self):
+        """Тест, доступный только владельцу и администратору"""
+        test = self.get_object()
+        if not is_owner(self.request.user, test):
+            raise PermissionDenied("Вы не являетесь владельцем этого теста")
+        return test
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Статистика прохождения теста (для владельца)"""
+        test = self.get_owned_test()
+        stats = TestStats.objects.filter(test=test).first() or TestStats(test=test)
+        return Response(TestStatsSerializer(stats).data)
+    
+    @action(detail=True, methods=['get'], url_path='item-analysis')
+    def item_analysis(self, request, pk=None):
+        """Анализ заданий: трудность, частота выбора ответов, дискриминация"""
+        return Response(item_analysis(self.get_owned_test()))
 
 
 class TestResultViewSet(viewsets.ReadOnlyModelViewSet):
@@ -265,8 +525,11 @@ class TestResultViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = TestResult.objects.all()
     serializer_class = TestResultSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SelectablePagination
+    # Совпадает с индексом learning_result_completed_idx
+    cursor_ordering = ('-completed_at', '-id')
     
-    def get_queryset(self):
+    def get_visible_queryset(self):
         user = self.request.user
         test_id = self.request.query_params.get('test', None)
         queryset = TestResult.objects.all()
@@ -278,7 +541,35 @@ class TestResultViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset
         elif user.is_teacher:
             # Преподаватели видят результаты своих тестов
-            return queryset.filter(test__material__section__owner=user)
+            return queryset.filter(owner=user.pk)
         else:
             # Студенты видят только свои результаты
-            return queryset.filter(user=user)
+            return queryset.filter(user=user.pk)
+    
+    def get_queryset(self):
+        return self.get_visible_queryset().select_related('test', 'user').prefetch_related(
+            user_answers_prefetch()
+        )
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Потоковая выгрузка результатов в CSV (?output=csv) или JSON Lines (?output=jsonl).
+        
+        Строки читаются порциями через values_list().iterator(), поэтому память
+        не зависит от размера выгрузки, а первые байты уходят клиенту сразу.
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Неизвестный формат выгрузки: {output}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        stream, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            stream(iter_result_rows(self.get_visible_queryset())),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="test-results.{output}"'
+        return response